@@ -1,19 +1,19 @@
-
 import time
-import board
-import adafruit_dht
+from sensors import DHT11Sampler
 
-# Define the sensor type and the GPIO pin
-sensor = adafruit_dht.DHT11(board.D4)
+# The sampler reads the sensor on its own thread (board.D4, every 2 s) and
+# retries failed reads with backoff; here we only print the cached value.
+sampler = DHT11Sampler()
+sampler.start()
 
 try:
-        # Read the humidity and temperature from the sensor
         while True:
-            temperature = sensor.temperature
-            humidity = sensor.humidity
-            print(f"Temp= {temperature:.1f}°C, Humidity= {humidity:.1f}%")
+            reading = sampler.latest()
+            if reading is not None:
+                temperature, humidity, age = reading
+                print(f"Temp= {temperature:.1f}°C, Humidity= {humidity:.1f}% (age {age:.1f}s, errors {sampler.errors})")
             time.sleep(2)
 except KeyboardInterrupt:
        pass
 finally:
-       sensor.exit()
\ No newline at end of file
+       sampler.stop()
@@ -1,20 +1,26 @@
 import os
+import atexit
 import time
 import threading
 import tkinter as tk
 from datetime import datetime
 from picamera2 import Picamera2
 from PIL import Image, ImageTk
-import psutil
-import serial
-import adafruit_dht
-import subprocess
-import pynmea2
-import seabreeze.spectrometers as sb
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 from picamera2.encoders import H264Encoder
+from spectrometer import SpectrometerWorker
+from processing import DarkSubtraction, BaselineCorrection, MovingAverage
+from plotting import SpectrumRenderer, MinMaxDecimator, RGBRenderer
+from camera import PreviewWorker, StillCapture, FrameMailbox, make_video_output, PretriggerOutput, configure_dual_stream, CameraFrameCounter
+from analysis import analyse_frame
+from sensors import DHT11Sampler, SystemTelemetry
+from gps import GPSReader
+from telemetry import TelemetryBus, TelemetryJoiner, SpectrumRecord
+from rover import RoverLink
+from archive import SpectrumArchiveWriter
+from diskwriter import DiskWriter
 
 # ---------- Configuration ----------
 SAVE_PATH = "/home/ulrich/Desktop/New code/Button Icon"
@@ -24,20 +30,42 @@ VIDEO_PATH = os.path.join(SAVE_PATH, "videos")
 os.makedirs(IMAGE_PATH, exist_ok=True)
 os.makedirs(VIDEO_PATH, exist_ok=True)
 
+# One dual-stream configuration for the whole session: 'main' for recording
+# and stills, 'lores' for the preview. Nothing reconfigures the sensor later.
+PREVIEW_SIZE = (400, 400)
+VIDEO_SIZE = (1920, 1080)
 picam2 = Picamera2()
-picam2.configure(picam2.create_still_configuration())
-
-#Initialize serial communication with Arduino
-#ser = serial.Serial('/dev/ttyACM0', 9600)
+configure_dual_stream(picam2, VIDEO_SIZE, PREVIEW_SIZE)
+picam2.start()
+
+# All file writes go through one background writer (see diskwriter.py). The
+# Tk thread must never wait on the SD card, so by default a full queue drops
+# the new job; the logger opts into blocking instead.
+disk_writer = DiskWriter(maxsize=256, policy='drop_newest', fsync='interval', fsync_interval=1.0)
+disk_writer.start()
+atexit.register(disk_writer.stop)  # Writes out whatever is still queued
+
+# Preview frames are captured off the Tk thread (see camera.py)
+preview_worker = PreviewWorker(picam2, 'lores', PREVIEW_SIZE)
+# Stills from the main stream; capture and encode run on a worker pool, the disk writer saves them
+still_capture = StillCapture(picam2, 'main', disk_writer=disk_writer)
+rgb_mailbox = FrameMailbox()  # Analysis of the latest still, for the RGB plot
+last_rgb_analysis = None
+
+# Serial link to the Arduino, written from its own thread (see rover.py)
+rover_link = RoverLink('/dev/ttyACM0', 115200)
+rover_link.start()
 
 # Global variables for recording
 recording = False
-encoder = None
+recording_encoder = None  # Encoder of a plain (not pre-triggered) recording
 video_filename = ""
 
-# Global variables for GPS
-gps_latitude = "N/A"
-gps_longitude = "N/A"
+# Pre-trigger buffer: when armed, its encoder runs all the time into memory
+pretrigger_output = None
+pretrigger_encoder = None
+PRETRIGGER_SECONDS = 10
+PRETRIGGER_MAX_BYTES = 32 * 1024 * 1024
 
 # Function to get the current timestamp
 def get_timestamp():
@@ -62,73 +90,78 @@ BUTTON_STYLE = {
     'font': ('Arial', 10, 'bold')
 }
 
-# Variable to store the dark spectrum and baseline correction
-dark_spectrum = None
-baseline_corrected_spectrum = None
-smoothed_spectrum = None
-
-# Spectrometer variables
-spec = None
-wavelengths_spec = None
-intensities_spec = None
+# All sensors publish timestamped samples here; the GUI reads the latest per topic
+telemetry_bus = TelemetryBus()
+# Nearest GPS / DHT11 / camera frame for each logged spectrum
+telemetry_joiner = TelemetryJoiner(telemetry_bus)
+picam2.post_callback = CameraFrameCounter(telemetry_bus)
+dark_counter = 0  # Id of the last captured dark spectrum
+
+# Spectrometer acquisition worker (owns the device, see spectrometer.py)
+spectrometer = SpectrometerWorker(integration_ms=50, bus=telemetry_bus)
+# Every consumer gets the same frame objects from the single acquisition stream
+plot_subscriber = spectrometer.subscribe("plot", policy='latest')
+displayed_frame = None  # Frame currently shown; Save and Dark Subtraction act on it
+spectrum_decimator = None  # Min/max per display column, rebuilt when the wavelength axis changes
+PLOT_COLUMNS = 400  # Width of the spectrograph panel in pixels
 
 # Global variable to control logging
 logging = False
-log_interval = 1000  # Default log interval in milliseconds
+log_interval = 1000  # Default log interval in milliseconds; 0 logs every frame
+LOG_QUEUE_FRAMES = 32  # Frames the logger may fall behind by when logging every frame
 
 # ---------- System Monitoring Functions ----------
-def get_cpu_temp():
-    try:
-        temp = os.popen('vcgencmd measure_temp').readline()
-        return temp.replace("temp=", "").replace("'C\n", "°C")
-    except:
+# Sampled from /sys and /proc in the background (see sensors.py)
+system_telemetry = SystemTelemetry(period=1.0, bus=telemetry_bus)
+system_telemetry.start()
+
+def get_cpu_temp(sample):
+    if sample.cpu_temp is None:
         return "N/A"
+    text = f"{sample.cpu_temp:.1f}°C"
+    if sample.under_voltage:
+        text += " (under-voltage)"
+    elif sample.throttling:
+        text += " (throttled)"
+    return text
 
 def get_system_info():
-    cpu_percent = psutil.cpu_percent()
-    memory = psutil.virtual_memory()
-    mem_percent = memory.percent
-    mem_used = round(memory.used / 1024 / 1024, 1)
-    mem_total = round(memory.total / 1024 / 1024, 1)
-    disk = psutil.disk_usage('/')
-    disk_percent = disk.percent
-    disk_free = round(disk.free / 1024 / 1024 / 1024, 1)
+    sample = telemetry_bus.latest_value('system')
+    if sample is None:
+        return {'cpu_temp': "N/A", 'cpu_usage': "N/A", 'memory': "N/A", 'disk': "N/A"}
     return {
-        'cpu_temp': get_cpu_temp(),
-        'cpu_usage': f"{cpu_percent}%",
-        'memory': f"{mem_used}MB / {mem_total}MB ({mem_percent}%)",
-        'disk': f"{disk_free}GB free ({disk_percent}% used)"
+        'cpu_temp': get_cpu_temp(sample),
+        'cpu_usage': f"{sample.cpu_percent:.1f}%",
+        'memory': f"{sample.mem_used_mb:.1f}MB / {sample.mem_total_mb:.1f}MB ({sample.mem_percent:.1f}%)",
+        'disk': f"{sample.disk_free_gb:.1f}GB free ({sample.disk_percent:.1f}% used)"
     }
 
+# GPS reader thread: GGA/RMC/VTG/GSA into timestamped fixes (see gps.py)
+gps_reader = GPSReader('/dev/ttyS0', 9600, bus=telemetry_bus)
+gps_reader.start()
+
 def read_gps_data():
-    global gps_latitude, gps_longitude
-    try:
-        ser = serial.Serial('/dev/ttyS0', 9600, timeout=0)
-        while True:
-            new_data = ser.readline().decode('utf-8')
-            if new_data.startswith('$GPGGA'):
-                newmsg = pynmea2.parse(new_data)
-                gps_latitude = newmsg.latitude
-                gps_longitude = newmsg.longitude
-            time.sleep(0.1)
-    except Exception as e:
-        print(f"Error reading GPS data: {e}")
+    fix = telemetry_bus.latest_value('gps')
+    if fix is None or fix.latitude is None:
+        return "N/A", "N/A"
+    if not fix.valid:
+        return f"{fix.latitude:.6f} (no fix)", f"{fix.longitude:.6f} (no fix)"
+    return f"{fix.latitude:.6f}", f"{fix.longitude:.6f}"
 
-gps_thread = threading.Thread(target=read_gps_data, daemon=True)
-gps_thread.start()
+# DHT11 is sampled in the background (see sensors.py); reading here never blocks
+dht11_sampler = DHT11Sampler(bus=telemetry_bus)
+dht11_sampler.start()
+DHT11_STALE_SECONDS = 10
 
 def read_dht11_data():
-    try:
-        sensor = adafruit_dht.DHT11
-        pin = 4
-        humidity, temperature = adafruit_dht.read_retry(sensor, pin)
-        if humidity is not None and temperature is not None:
-            return f"{temperature}°C", f"{humidity}%"
-        else:
-            return "N/A", "N/A"
-    except Exception as e:
-        print(f"Error reading DHT11 data: {e}")
+    sample = telemetry_bus.latest('dht11')
+    if sample is None:
         return "N/A", "N/A"
+    temperature, humidity = sample.value.temperature, sample.value.humidity
+    age = time.monotonic() - sample.timestamp
+    if age > DHT11_STALE_SECONDS:
+        return f"{temperature}°C ({age:.0f}s old)", f"{humidity}% ({age:.0f}s old)"
+    return f"{temperature}°C", f"{humidity}%"
 
 def update_system_info():
     system_info = get_system_info()
@@ -139,108 +172,111 @@ def update_system_info():
     system_info_values['memory'].config(text=system_info['memory'])
     system_info_values['disk'].config(text=system_info['disk'])
 
-    environment_info_values['latitude'].config(text=str(gps_latitude))
-    environment_info_values['longitude'].config(text=str(gps_longitude))
+    latency = disk_writer.latency_percentiles()
+    latency_text = "" if latency is None else ", p50 {:.0f} / p99 {:.0f} ms".format(*latency)
+    system_info_values['disk_writer'].config(
+        text=f"{disk_writer.bytes_per_second / 1024:.0f} KB/s, queue {disk_writer.depth}/{disk_writer.maxsize}"
+             f"{latency_text}, {disk_writer.dropped} dropped",
+        fg='orange' if disk_writer.dropped or disk_writer.errors else 'white')
+
+    gps_data = read_gps_data()
+    environment_info_values['latitude'].config(text=gps_data[0])
+    environment_info_values['longitude'].config(text=gps_data[1])
     environment_info_values['temperature'].config(text=dht11_data[0])
     environment_info_values['humidity'].config(text=dht11_data[1])
 
+    if pretrigger_output is not None:
+        pretrigger_button.config(text=f"Pre-trigger: {pretrigger_output.buffered_seconds():.1f}s")
+
+    if rover_link.connected:
+        latency = rover_link.latency_percentiles()
+        if latency is None:
+            rtt_text = "RTT: no ACKs yet"
+        else:
+            rtt_text = "RTT p50 {:.1f} / p90 {:.1f} / p99 {:.1f} ms".format(*latency)
+        rover_link_label.config(text=f"Link: {rover_link.writes_per_second:.0f} writes/s, "
+                                     f"{rover_link.coalesced} coalesced, {rover_link.lost} lost\n{rtt_text}\n"
+                                     f"Setpoints: {rover_link.setpoints_per_second:.0f}/s "
+                                     f"({rover_link.unchanged} unchanged skipped), "
+                                     f"missed heartbeats: {rover_link.missed_heartbeats}, "
+                                     f"watchdog stops: {rover_link.watchdog_stops}, "
+                                     f"expired holds: {rover_link.expired_holds}",
+                                fg='#a0a0a0' if latency is not None else 'orange')
+    else:
+        rover_link_label.config(text="Link: not connected", fg='red')
+
     root.after(1000, update_system_info)
 
 def update_preview():
-    if not picam2.started:
+    if not preview_worker.running:
         return
 
     try:
-        frame = picam2.capture_array()
-        img = Image.fromarray(frame).resize((400, 400))
-        tk_img = ImageTk.PhotoImage(img)
-        image_label.config(image=tk_img)
-        image_label.image = tk_img
+        frame = preview_worker.mailbox.take()
+        if frame is not None:
+            # Paste into the one persistent PhotoImage instead of creating a new one
+            preview_photo.paste(Image.fromarray(frame))
+        stats_text = f"Preview: {preview_worker.fps:.1f} fps, {preview_worker.mailbox.dropped} dropped"
+        if preview_stats_label.cget('text') != stats_text:
+            preview_stats_label.config(text=stats_text)
     except Exception as e:
         print(f"Preview error: {e}")
 
-    root.after(50, update_preview)
+    root.after(30, update_preview)
 
 def start_preview():
     try:
-        config = picam2.create_preview_configuration(main={"size":(400,400)}, buffer_count=3)
-        picam2.configure(config)
-        picam2.start()
-        
+        if preview_worker.running:
+            return
+        # The camera is already running, only the lores consumer starts
+        preview_worker.start()
+        image_label.config(image=preview_photo)
+
         update_preview()
     except Exception as e:
         print(f"Error starting preview: {e}")
 
 def stop_preview():
     try:
-        picam2.stop()
+        preview_worker.stop()
         image_label.config(image='')
+        preview_stats_label.config(text="")
     except Exception as e:
         print(f"Error stopping preview: {e}")
 
 # Function to capture an image and plot RGB intensity vs. wavelength
+def analyse_capture(frame):
+    # Runs on the still worker with the full-resolution frame
+    rgb_mailbox.put(analyse_frame(frame, tiles=(4, 4)))
+
 def capture_image():
     try:
-        # Capture an image using the Pi Camera
-        picam2.start()
-        frame = picam2.capture_array()
-        picam2.stop()
-
-        # Convert the captured frame to an RGB image
-        img = Image.fromarray(frame)
-        img = img.resize((400, 400))
-
-        # Ensure the image is in RGB format before saving
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # Save the captured image
         timestamp = get_timestamp()
         filename = os.path.join(IMAGE_PATH, f"img_{timestamp}.jpg")
-        img.save(filename)
-        print(f"Image saved to {filename}")
-
-        # Extract the RGB channels
-        img_array = np.array(img)
-        red_channel = img_array[:, :, 0].flatten()
-        green_channel = img_array[:, :, 1].flatten()
-        blue_channel = img_array[:, :, 2].flatten()
-
-        # Calculate the average intensity for each channel
-        avg_red_intensity = np.mean(red_channel)
-        avg_green_intensity = np.mean(green_channel)
-        avg_blue_intensity = np.mean(blue_channel)
-
-        # Clear the previous plot
-        rgb_ax.clear()
-
-        # Plot the average intensities as lines
-        wavelengths = [470, 530, 635]  # Updated wavelengths for RGB
-        intensities = [avg_blue_intensity, avg_green_intensity, avg_red_intensity]
-        rgb_ax.plot([470, 470], [0, avg_blue_intensity], color='blue', label='Blue')
-        rgb_ax.plot([530, 530], [0, avg_green_intensity], color='green', label='Green')
-        rgb_ax.plot([635, 635], [0, avg_red_intensity], color='red', label='Red')
-
-        # Add markers at the average intensity points
-        rgb_ax.scatter([470], [avg_blue_intensity], color='blue')
-        rgb_ax.scatter([530], [avg_green_intensity], color='green')
-        rgb_ax.scatter([635], [avg_red_intensity], color='red')
-
-        # Add labels and title
-        rgb_ax.set_title('Average RGB Intensity vs. Wavelength')
-        rgb_ax.set_xlabel('Wavelength (nm)')
-        rgb_ax.set_ylabel('Average Intensity')
-        rgb_ax.set_xlim([150, 925])  # Adjusted x-axis range to accommodate new wavelengths
-        rgb_ax.set_ylim([0, max(intensities) * 1.1])
-
-        # Draw the plot on the canvas
-        rgb_canvas.draw()
-        print("RGB plot updated successfully.")
+        still_capture.capture(filename, on_captured=analyse_capture)
+    except Exception as e:
+        print(f"Error capturing image: {e}")
+
+def update_rgb_plot():
+    global last_rgb_analysis
+    try:
+        analysis = rgb_mailbox.take()
+        if analysis is not None:
+            # Means, histograms and tile grid are kept for later use; the plot shows the means
+            last_rgb_analysis = analysis
+            rgb_renderer.update(analysis.means)
+            print("RGB plot updated successfully.")
     except Exception as e:
-        print(f"Error capturing image and plotting RGB: {e}")
+        print(f"Error plotting RGB: {e}")
+
+    root.after(100, update_rgb_plot)
 
 
 def start_recording():
+    # Armed pre-trigger: the last seconds are already encoded, start right away
+    if pretrigger_output is not None:
+        start_pretriggered_recording()
+        return
     show_countdown_timer(3)
 
 def show_countdown_timer(count):
@@ -252,50 +288,166 @@ def show_countdown_timer(count):
         start_recording_after_countdown()
 
 def start_recording_after_countdown():
-    global recording, encoder, video_filename
+    global recording, recording_encoder, video_filename
     if recording:
         return
+    # Pre-trigger may have been armed during the countdown; it already
+    # encodes the main stream, so record from its buffer
+    if pretrigger_output is not None:
+        start_pretriggered_recording()
+        return
 
     try:
-        video_filename = os.path.join(VIDEO_PATH, f"video_{get_timestamp()}.h264")
-        encoder = H264Encoder()
+        # Muxed into MP4 while streaming, no raw .h264 file or ffmpeg pass afterwards
+        video_filename = os.path.join(VIDEO_PATH, f"video_{get_timestamp()}.mp4")
+        recording_encoder = H264Encoder()
         recording = True
-        picam2.stop()
-        picam2.configure(picam2.create_video_configuration())
-        picam2.start()
-        picam2.start_recording(encoder, video_filename)
+        # Attach an encoder to the running main stream; preview keeps going
+        picam2.start_encoder(recording_encoder, make_video_output(video_filename), name="main")
     except Exception as e:
+        recording = False
+        recording_encoder = None
         print(f"Error starting recording: {e}")
 
 def stop_recording():
-    global recording, encoder, video_filename
+    global recording, recording_encoder, video_filename
     if not recording:
         return
 
+    if recording_encoder is None:
+        # Close the file and go back to buffering, the encoder keeps running
+        def _release():
+            global recording
+            try:
+                pretrigger_output.release()
+                recording = False
+                print(f"Video saved to {video_filename}")
+            except Exception as e:
+                print(f"Error stopping recording: {e}")
+
+        threading.Thread(target=_release, daemon=True).start()
+        return
+
     def _stop():
-        global recording, encoder, video_filename
+        global recording, recording_encoder, video_filename
         try:
-            picam2.stop_recording()
-            picam2.stop()
-            picam2.configure(picam2.create_still_configuration())
-            picam2.start()
+            picam2.stop_encoder(recording_encoder)
             recording = False
-            encoder = None
-
-            if video_filename:
-                mp4_filename = video_filename.replace(".h264", ".mp4")
-                def convert_to_mp4():
-                    subprocess.run(["ffmpeg", "-i", video_filename, "-c:v", "copy", "-movflags", "+faststart", mp4_filename], check=True)
-                    os.remove(video_filename)
-                threading.Thread(target=convert_to_mp4, daemon=True).start()
+            recording_encoder = None
+            print(f"Video saved to {video_filename}")
         except Exception as e:
             print(f"Error stopping recording: {e}")
 
     threading.Thread(target=_stop, daemon=True).start()
 
+def start_pretriggered_recording():
+    global recording, video_filename
+    if recording:
+        return
+    video_filename = os.path.join(VIDEO_PATH, f"video_{get_timestamp()}.mp4")
+    recording = True
+    output = pretrigger_output
+
+    # Writing out the buffer (up to PRETRIGGER_MAX_BYTES) runs off the Tk
+    # thread; trigger() is also usable from others, e.g. a spectral trigger
+    def _trigger():
+        global recording
+        try:
+            if not output.trigger(make_video_output(video_filename)):
+                recording = False
+        except Exception as e:
+            recording = False
+            print(f"Error starting recording: {e}")
+
+    threading.Thread(target=_trigger, daemon=True).start()
+
+def toggle_pretrigger():
+    global pretrigger_output, pretrigger_encoder
+    if recording:
+        print("Stop the recording before changing the pre-trigger.")
+        return
+    try:
+        if pretrigger_output is None:
+            pretrigger_output = PretriggerOutput(PRETRIGGER_MAX_BYTES, PRETRIGGER_SECONDS)
+            # A keyframe every second bounds how much of the buffer has to be skipped
+            pretrigger_encoder = H264Encoder(iperiod=30)
+            picam2.start_encoder(pretrigger_encoder, pretrigger_output, name="main")
+            pretrigger_button.config(text="Pre-trigger: ON")
+        else:
+            picam2.stop_encoder(pretrigger_encoder)
+            pretrigger_output = None
+            pretrigger_encoder = None
+            pretrigger_button.config(text="Pre-trigger: OFF")
+    except Exception as e:
+        print(f"Error toggling pre-trigger: {e}")
+
 # D-pad controller
 def send_command(command):
-    ser.write((command + '\n').encode())
+    # Click mode; queued for the link thread, repeated presses coalesce.
+    # In hold-to-drive mode the press/release bindings below drive instead.
+    if command == 'stop':
+        rover_link.release()
+    elif not hold_to_drive.get():
+        rover_link.send_direction(command)
+
+# Hold-to-drive: setpoints stream while a D-pad button or arrow key is held.
+# The link ends a hold by itself unless refresh_hold() keeps it alive, so a
+# stalled GUI stops the rover too.
+pending_release = None
+holding = False
+KEY_DIRECTIONS = {'Up': 'forward', 'Down': 'backward', 'Left': 'left', 'Right': 'right'}
+
+def press_direction(command):
+    global pending_release, holding
+    if pending_release is not None:
+        root.after_cancel(pending_release)
+        pending_release = None
+    if hold_to_drive.get():
+        holding = True
+        rover_link.hold(command)
+    else:
+        rover_link.send_direction(command)
+
+def release_direction(event=None):
+    # Key auto-repeat sends release/press pairs, so a release only ends the
+    # hold if no press follows within 50 ms
+    global pending_release
+    if hold_to_drive.get() and pending_release is None:
+        pending_release = root.after(50, finish_release)
+
+def finish_release():
+    global pending_release, holding
+    pending_release = None
+    holding = False
+    rover_link.release()
+
+def refresh_hold():
+    if holding:
+        rover_link.keep_holding()
+    root.after(100, refresh_hold)
+
+def on_focus_out(event):
+    # A key let go in another window never reaches us, so losing focus ends
+    # the hold. Focus moving between our own widgets does not.
+    root.after_idle(check_focus)
+
+def check_focus():
+    if holding and root.focus_get() is None:
+        if pending_release is not None:
+            root.after_cancel(pending_release)
+        finish_release()
+
+def on_key_press(event):
+    if isinstance(event.widget, tk.Entry):
+        return
+    if event.keysym == 'space':
+        stop()
+    elif event.keysym in KEY_DIRECTIONS:
+        press_direction(KEY_DIRECTIONS[event.keysym])
+
+def on_key_release(event):
+    if not isinstance(event.widget, tk.Entry) and event.keysym in KEY_DIRECTIONS:
+        release_direction()
 
 def forward():
     send_command('forward')
@@ -312,9 +464,17 @@ def right():
 def stop():
     send_command('stop')
 
-def send_speed():
-    speed = speed_slider.get()
-    ser.write(f"speed {speed}\n".encode())
+# Speed and steering go to the link as they change; it only sends the
+# resulting left/right setpoint when it differs, at most 20 times a second
+def send_speed(value=None):
+    rover_link.set_speed(speed_slider.get())
+
+def send_steering(value=None):
+    rover_link.set_steering(steering_slider.get() / 100)
+
+def centre_steering():
+    steering_slider.set(0)
+    send_steering()
 
 # Load and resize icons
 def load_icon(path, size):
@@ -326,67 +486,54 @@ def load_icon(path, size):
 
 # Connect Button
 def connect_spectrometer():
-    global spec, wavelengths_spec
     try:
-        devices = sb.list_devices()
-        if devices:
-            spec = sb.Spectrometer(devices[0])
-            spec.integration_time_micros(50000)  # Set integration time in microseconds
-            wavelengths_spec = spec.wavelengths()
-            spectrometer_status_label.config(text="Spectrometer Detected: " + spec.model, fg='green')
+        if spectrometer.spec is not None:
+            return
+        if spectrometer.open():
+            spectrometer_status_label.config(text="Spectrometer Detected: " + spectrometer.model, fg='green')
         else:
             spectrometer_status_label.config(text="No spectrometer found", fg='red')
     except Exception as e:
         spectrometer_status_label.config(text="Failed to detect spectrometer: " + str(e), fg='red')
 
 def disconnect_spectrometer():
-    global spec
     try:
-        if spec is not None:
-            spec.close()
-            spec = None
+        if spectrometer.spec is not None:
+            spectrometer.close()
             spectrometer_status_label.config(text="Spectrometer Disconnected", fg='red')
     except Exception as e:
         spectrometer_status_label.config(text="Failed to disconnect spectrometer: " + str(e), fg='red')
 
 # Function to update the spectrometer plot
 def update_spectrometer_plot():
+    global displayed_frame, spectrum_decimator
     try:
-        if spec is not None:
-            wavelengths = spec.wavelengths()
-            intensities = spec.intensities()
-
-            # Clear the previous plot
-            ax.clear()
-
-            # Plot the spectral data
-            ax.plot(wavelengths, intensities, label='Spectrum')
-
-            # Dynamically set y-axis limits based on the measured intensities
-            min_intensity = np.min(intensities) * 0.9  # 10% below the minimum intensity
-            max_intensity = np.max(intensities) * 1.1  # 10% above the maximum intensity
-            ax.set_ylim([min_intensity, max_intensity])
-
-            # Add labels and title
-            ax.set_title('Spectral Intensity vs. Wavelength')
-            ax.set_xlabel('Wavelength (nm)')
-            ax.set_ylabel('Intensity')
-            ax.legend()
-
-            # Draw the plot on the canvas
-            canvas.draw()
-
-        # Schedule the next update
-        root.after(100, update_spectrometer_plot)  # Update every 1 second
+        frame = plot_subscriber.get_nowait()
+        # Only redraw when the acquisition thread has produced a new frame
+        if frame is not None:
+            displayed_frame = frame
+            if spectrum_decimator is None or spectrum_decimator.source is not frame.wavelengths:
+                spectrum_decimator = MinMaxDecimator(frame.wavelengths, PLOT_COLUMNS)
+            # ~800 points instead of the full 3648, peaks are kept by min/max
+            wavelengths, intensities = spectrum_decimator.decimate(frame.processed)
+            # Persistent line + blitting; y-limits only move when the data leaves the band
+            spectrum_renderer.update(wavelengths, intensities)
+        # Every tick, so the rate falls to 0 when frames stop coming
+        fps_text = f"Plot: {spectrum_renderer.fps:.1f} fps"
+        if plot_fps_label.cget('text') != fps_text:
+            plot_fps_label.config(text=fps_text)
     except Exception as e:
         print(f"Error updating spectrometer plot: {e}")
+
+    # Schedule the next update
+    root.after(100, update_spectrometer_plot)
         
 def set_integration_time():
     try:
         value = int(integration_time_entry.get())
         if 1 <= value <= 1000:
-            if spec is not None:
-                spec.integration_time_micros(value * 1000)  # Convert ms to microseconds
+            if spectrometer.spec is not None:
+                spectrometer.set_integration_time(value)
                 print(f"Integration time set to {value} ms")
             else:
                 print("Spectrometer is not connected.")
@@ -406,13 +553,16 @@ def set_trigger_mode():
         print(f"Error setting trigger mode: {e}")
         
 # Define Dark substraction function
+# Dark, baseline and smoothing are stages of the live processing pipeline
+# (see processing.py); the buttons only switch them on and off.
 def dark_subtraction():
-    global dark_spectrum
+    global dark_counter
     try:
-        if spec is not None:
-            dark_wavelengths = spec.wavelengths()
-            dark_intensities = spec.intensities()
-            dark_spectrum = (dark_wavelengths, dark_intensities)
+        frame = displayed_frame
+        if frame is not None:
+            dark_counter += 1
+            # Capture the dark from the raw intensities, not the processed ones
+            spectrometer.pipeline.set_stage('dark', DarkSubtraction(frame.intensities, dark_counter))
             print("Dark spectrum captured and stored.")
         else:
             print("Spectrometer is not connected.")
@@ -422,21 +572,26 @@ def dark_subtraction():
 # Define the save function
 def save_data():
     try:
-        if spec is not None:
-            wavelengths = spec.wavelengths()
-            intensities = spec.intensities()
+        frame = displayed_frame
+        if frame is not None:
+            wavelengths = frame.wavelengths
+            # Copy: the ring slot behind frame.intensities is reused later
+            intensities = np.array(frame.intensities)
             timestamp = get_timestamp()
             save_path = os.path.join(SAVE_PATH, "spectra")
             os.makedirs(save_path, exist_ok=True)
             file_name = f"spectrum_{timestamp}.csv"
             file_path = os.path.join(save_path, file_name)
 
-            with open(file_path, 'w') as file:
-                file.write("Wavelength,Intensity\n")
-                for wl, intensity in zip(wavelengths, intensities):
-                    file.write(f"{wl},{intensity}\n")
+            # Formatted and written on the disk writer thread
+            def write_csv(file):
+                lines = [f"{wl},{intensity}\n" for wl, intensity in zip(wavelengths, intensities)]
+                file.write(("Wavelength,Intensity\n" + "".join(lines)).encode())
 
-            print(f"Data saved to {file_path}")
+            if disk_writer.write_file(file_path, write_csv):
+                print(f"Data queued for {file_path}")
+            else:
+                print(f"Disk busy, spectrum not saved to {file_path}")
         else:
             print("Spectrometer is not connected.")
     except Exception as e:
@@ -444,26 +599,16 @@ def save_data():
 
 # Smooth Spectrum Button
 def smooth_spectrum():
-    global smoothed_spectrum
     try:
-        if spec is not None:
-            wavelengths = spec.wavelengths()
-            intensities = spec.intensities()
-
-            if dark_spectrum is not None:
-                dark_wavelengths, dark_intensities = dark_spectrum
-                corrected_intensities = intensities - dark_intensities
+        pipeline = spectrometer.pipeline
+        if pipeline is not None:
+            if pipeline.get_stage('smooth') is None:
+                window_size = 5  # Define the window size for the moving average
+                pipeline.set_stage('smooth', MovingAverage(pipeline.n_pixels, window_size))
+                print("Spectrum smoothing enabled.")
             else:
-                corrected_intensities = intensities
-
-            if baseline_corrected_spectrum is not None:
-                wavelengths, corrected_intensities = baseline_corrected_spectrum
-
-            window_size = 5  # Define the window size for the moving average
-            smoothed_intensities = np.convolve(corrected_intensities, np.ones(window_size)/window_size, mode='valid')
-
-            smoothed_spectrum = (wavelengths[:len(smoothed_intensities)], smoothed_intensities)
-            print("Spectrum smoothed.")
+                pipeline.set_stage('smooth', None)
+                print("Spectrum smoothing disabled.")
         else:
             print("Spectrometer is not connected.")
     except Exception as e:
@@ -471,30 +616,15 @@ def smooth_spectrum():
 
 # Baseline Correction Button
 def baseline_correction():
-    global baseline_corrected_spectrum
     try:
-        if spec is not None:
-            wavelengths = spec.wavelengths()
-            intensities = spec.intensities()
-
-            if dark_spectrum is not None:
-                dark_wavelengths, dark_intensities = dark_spectrum
-                corrected_intensities = intensities - dark_intensities
+        pipeline = spectrometer.pipeline
+        if pipeline is not None:
+            if pipeline.get_stage('baseline') is None:
+                pipeline.set_stage('baseline', BaselineCorrection(spectrometer.wavelengths))
+                print("Baseline correction enabled.")
             else:
-                corrected_intensities = intensities
-
-            baseline_points = np.percentile(corrected_intensities, 10)
-            baseline_indices = np.where(corrected_intensities <= baseline_points)[0]
-            baseline_wavelengths = wavelengths[baseline_indices]
-            baseline_intensities = corrected_intensities[baseline_indices]
-
-            coefficients = np.polyfit(baseline_wavelengths, baseline_intensities, 2)  # 2nd order polynomial
-            baseline = np.polyval(coefficients, wavelengths)
-
-            baseline_corrected_intensities = corrected_intensities - baseline
-
-            baseline_corrected_spectrum = (wavelengths, baseline_corrected_intensities)
-            print("Baseline correction applied.")
+                pipeline.set_stage('baseline', None)
+                print("Baseline correction disabled.")
         else:
             print("Spectrometer is not connected.")
     except Exception as e:
@@ -517,47 +647,65 @@ def stop_logging():
     logging = False
     print("Logging stopped.")
 
+def open_session_archive(name, wavelengths):
+    # A session started within the same second as the last one gets _2, _3...
+    path = name
+    suffix = 1
+    while True:
+        try:
+            return SpectrumArchiveWriter(path, wavelengths, disk_writer=disk_writer, policy='block')
+        except FileExistsError:
+            suffix += 1
+            path = f"{name}_{suffix}"
+
 def logging_loop():
     global logging, log_interval
+    every_frame = log_interval <= 0
+    if every_frame:
+        log_subscriber = spectrometer.subscribe("logger", policy='drop_oldest', maxsize=LOG_QUEUE_FRAMES)
+    else:
+        log_subscriber = spectrometer.subscribe("logger", policy='latest')
+    # One archive per logging session (see archive.py), opened on the first
+    # spectrum because that is when the wavelength axis is known
+    archive = None
+    next_due = time.monotonic()
     while logging:
         try:
-            if spec is not None:
-                wavelengths = spec.wavelengths()
-                intensities = spec.intensities()
-
-                # Apply dark subtraction if dark spectrum is available
-                if dark_spectrum is not None:
-                    dark_wavelengths, dark_intensities = dark_spectrum
-                    corrected_intensities = intensities - dark_intensities
-                else:
-                    corrected_intensities = intensities
-
-                # Apply baseline correction if baseline-corrected spectrum is available
-                if baseline_corrected_spectrum is not None:
-                    wavelengths, corrected_intensities = baseline_corrected_spectrum
-
-                # Apply smoothing if smoothed spectrum is available
-                if smoothed_spectrum is not None:
-                    wavelengths, corrected_intensities = smoothed_spectrum
-
-                # Save the data to a CSV file
-                timestamp = get_timestamp()
-                save_path = os.path.join(SAVE_PATH, "logs")
-                os.makedirs(save_path, exist_ok=True)
-                file_name = f"log_{timestamp}.csv"
-                file_path = os.path.join(save_path, file_name)
-
-                with open(file_path, 'w') as file:
-                    file.write("Wavelength,Intensity\n")
-                    for wl, intensity in zip(wavelengths, corrected_intensities):
-                        file.write(f"{wl},{intensity}\n")
-
-                print(f"Log saved to {file_path}")
-            else:
+            if not every_frame:
+                # Runs to a schedule, so the time spent writing does not add
+                # to the interval
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_due += log_interval / 1000
+                if next_due < time.monotonic():
+                    # Fell behind: start again from now rather than catch up in a burst
+                    next_due = time.monotonic() + log_interval / 1000
+            frame = log_subscriber.get(timeout=0.5)
+            if frame is not None:
+                # Dark/baseline/smoothing were already applied to this frame by the pipeline.
+                # Conditions at the time of this spectrum, not at the time of writing
+                record = SpectrumRecord(frame, telemetry_joiner.join(frame.timestamp))
+                if archive is None:
+                    save_path = os.path.join(SAVE_PATH, "logs")
+                    os.makedirs(save_path, exist_ok=True)
+                    # Blocking only slows this thread; the subscriber then drops
+                    # frames, it never stalls the acquisition
+                    archive = open_session_archive(os.path.join(save_path, f"session_{get_timestamp()}"),
+                                                   frame.wavelengths)
+                    print(f"Logging to {archive.path}.spec")
+                archive.append(frame, record)
+            elif spectrometer.spec is None:
                 print("Spectrometer is not connected.")
+                time.sleep(1.0)
         except Exception as e:
             print(f"Error during logging: {e}")
-        time.sleep(log_interval / 1000)  # Convert milliseconds to seconds
+            time.sleep(1.0)
+    spectrometer.unsubscribe(log_subscriber)
+    if archive is not None:
+        archive.close()
+        lost = f", {archive.lost} lost to write errors" if archive.lost else ""
+        print(f"Logged {archive.count} spectra to {archive.path}.spec{lost}")
 
 # Define icon paths and sizes
 icon_paths = {
@@ -581,7 +729,7 @@ status_frame = tk.Frame(main_frame, bg='#2d2d2d', width=350)
 status_frame.pack(side='left', fill='y', padx=(0, 10))
 
 # System Status Panel
-system_info_frame = tk.Frame(status_frame, bg='#3d3d3d', width=350, height=200, borderwidth=2, relief='solid')
+system_info_frame = tk.Frame(status_frame, bg='#3d3d3d', width=350, height=235, borderwidth=2, relief='solid')
 system_info_frame.pack_propagate(0)
 system_info_frame.pack(fill='x', pady=(0, 10))
 
@@ -591,7 +739,8 @@ system_info_labels = {
     'cpu_temp': "CPU Temperature:",
     'cpu_usage': "CPU Usage:",
     'memory': "Memory Usage:",
-    'disk': "Disk Space:"
+    'disk': "Disk Space:",
+    'disk_writer': "Disk Writes:"
 }
 
 system_info_values = {}
@@ -648,6 +797,13 @@ connect_button = tk.Button(control_frame, image=icons["connect"], command=connec
 connect_button.image = icons["connect"]
 connect_button.pack(side='left', padx=5, pady=5)
 
+pretrigger_button = tk.Button(control_frame, text="Pre-trigger: OFF", command=toggle_pretrigger, **BUTTON_STYLE)
+pretrigger_button.pack(side='left', padx=5, pady=5)
+
+# Measured preview rate and frames the GUI never got to show
+preview_stats_label = tk.Label(control_frame, text="", bg='#2d2d2d', fg='#a0a0a0', font=('Arial', 10))
+preview_stats_label.pack(side='left', padx=5)
+
 # Container frame
 top_container_frame=tk.Frame(main_frame, bg='#2d2d2d', width=820, height=400, borderwidth=2, relief='solid')
 top_container_frame.pack(side='top', fill='x')
@@ -660,6 +816,9 @@ preview_frame.pack(side='right', padx=2,pady=2,fill='none',expand=False)
 image_label = tk.Label(preview_frame, bg='black', borderwidth=2, relief='solid')
 image_label.pack(fill='both', expand=True)
 
+# Single PhotoImage reused for every preview frame
+preview_photo = ImageTk.PhotoImage('RGB', PREVIEW_SIZE)
+
 countdown_label = tk.Label(preview_frame, text="", 
                          font=("Arial", 30, "bold"), 
                          fg="red", bg='black', highlightthickness=0)
@@ -673,6 +832,7 @@ spectrograph_frame.pack(side='left', padx=2,pady=2,fill='none',expand=False)
 fig, ax = plt.subplots(figsize=(4,4))
 canvas = FigureCanvasTkAgg(fig, master=spectrograph_frame)
 canvas.get_tk_widget().pack(fill='both', expand=True)
+spectrum_renderer = SpectrumRenderer(canvas, ax)
 
 # RGB Container frame
 RGB_container_frame=tk.Frame(main_frame, bg='#2d2d2d', width=430, height=200)
@@ -686,6 +846,7 @@ rgb_graph_frame.pack_propagate(0)  # Prevent the frame from resizing
 rgb_fig, rgb_ax = plt.subplots(figsize=(4, 1))
 rgb_canvas = FigureCanvasTkAgg(rgb_fig, master=rgb_graph_frame)
 rgb_canvas.get_tk_widget().pack(fill='both', expand=True)
+rgb_renderer = RGBRenderer(rgb_canvas, rgb_ax)
 
 # Rover Controller Frame
 rover_controller_frame = tk.Frame(status_frame, bg='#3d3d3d', width=350, height=200, borderwidth=2, relief='solid')
@@ -713,6 +874,23 @@ button_right.grid(row=1, column=2, padx=1, pady=1)
 button_down = tk.Button(d_pad_frame, text="↓", width=2, height=2, font=('Helvetica', 20), command=backward, borderwidth=1, relief='solid')
 button_down.grid(row=2, column=1, padx=1, pady=1)
 
+for button, command in ((button_up, 'forward'), (button_left, 'left'),
+                        (button_right, 'right'), (button_down, 'backward')):
+    button.bind('<ButtonPress-1>', lambda event, command=command: hold_to_drive.get() and press_direction(command))
+    button.bind('<ButtonRelease-1>', release_direction)
+root.bind('<KeyPress>', on_key_press)
+root.bind('<KeyRelease>', on_key_release)
+root.bind('<FocusOut>', on_focus_out)
+
+# Hold-to-drive mode (default) or click to latch a direction
+hold_to_drive = tk.BooleanVar(value=True)
+tk.Checkbutton(rover_controller_frame, text="Hold to drive (arrow keys, space = stop)", variable=hold_to_drive,
+               bg='#3d3d3d', fg='white', selectcolor='#2d2d2d', activebackground='#3d3d3d').pack()
+
+# Rover serial link statistics
+rover_link_label = tk.Label(rover_controller_frame, text="", bg='#3d3d3d', fg='#a0a0a0', font=('Arial', 9))
+rover_link_label.pack(pady=(0, 5))
+
 # Motor Speed Frame
 speed_control_frame = tk.Frame(status_frame, bg='#3d3d3d', width=350, height=100, borderwidth=2, relief='solid')
 speed_control_frame.pack(fill='x', pady=(5, 10))
@@ -720,13 +898,19 @@ speed_control_frame.pack(fill='x', pady=(5, 10))
 tk.Label(speed_control_frame, text="MOTOR SPEED", bg='#3d3d3d', fg='white', font=('Arial', 12, 'bold')).pack(pady=(10, 15))
 
 # Speed slider
-speed_slider = tk.Scale(speed_control_frame, from_=0, to=255, orient='horizontal', label="Speed", length=300, bg='#3d3d3d', fg='white')
+speed_slider = tk.Scale(speed_control_frame, from_=0, to=255, orient='horizontal', label="Speed", length=300, bg='#3d3d3d', fg='white',
+                        command=send_speed)
 speed_slider.set(128)  # Default speed
 speed_slider.pack()
 
-# Button to send speed value to Arduino
-send_speed_button = tk.Button(speed_control_frame, text="Set Speed", command=send_speed, **BUTTON_STYLE)
-send_speed_button.pack(pady=5)
+# Steering slider, -100 (full left) to 100 (full right) while driving forward or backward
+steering_slider = tk.Scale(speed_control_frame, from_=-100, to=100, orient='horizontal', label="Steering", length=300, bg='#3d3d3d', fg='white',
+                           command=send_steering)
+steering_slider.set(0)
+steering_slider.pack()
+
+centre_steering_button = tk.Button(speed_control_frame, text="Centre Steering", command=centre_steering, **BUTTON_STYLE)
+centre_steering_button.pack(pady=5)
 
 # Spectrometer Control Frame
 spectrometer_control_frame = tk.Frame(main_frame, bg='#2d2d2d', width=410, height=200, borderwidth=2, relief='solid')
@@ -801,11 +985,19 @@ spectrometer_status_section.pack(side='top', fill='x', pady=5, padx=2)
 spectrometer_status_label = tk.Label(spectrometer_status_section, text="No spectrometer found", bg='#2d2d2d', fg='white', font=('Arial', 12, 'bold'))
 spectrometer_status_label.pack(side='left', padx=2)
 
+# Achieved spectrum plot refresh rate
+plot_fps_label = tk.Label(spectrometer_status_section, text="", bg='#2d2d2d', fg='#a0a0a0', font=('Arial', 10))
+plot_fps_label.pack(side='right', padx=2)
+
 
 # Start the dynamic plot update
 update_spectrometer_plot()
 # Start system monitoring
 update_system_info()
+# Pick up RGB results from the still capture worker
+update_rgb_plot()
+# Keep a held D-pad button or arrow key driving
+refresh_hold()
 
 root.mainloop()
 
@@ -0,0 +1,50 @@
+import numpy as np
+
+# ---------- RGB Analysis Engine ----------
+# Statistics of a captured camera frame (H x W x 3 or 4, uint8). Everything is
+# done with axis reductions on views of the frame; nothing is flattened or
+# copied per channel. Meant to run on a worker thread with the full-res still.
+# The histograms are the one exception: np.bincount copies its input into
+# integer indices, so they are counted a band of rows at a time and each
+# copy stays at one band of one channel (~1 MB at 1080p, not 16 MB).
+HISTOGRAM_BAND_ROWS = 64
+
+class RGBAnalysis:
+    __slots__ = ('means', 'histograms', 'tile_means', 'tile_max', 'shape')
+
+    def __init__(self, means, histograms, tile_means, tile_max, shape):
+        self.means = means            # (3,) mean R, G, B over the whole frame
+        self.histograms = histograms  # (3, 256) pixel counts per channel
+        self.tile_means = tile_means  # (rows, cols, 3)
+        self.tile_max = tile_max      # (rows, cols, 3) peak value, shows saturated tiles
+        self.shape = shape
+
+
+def analyse_frame(frame, tiles=(4, 4)):
+    rgb = frame[:, :, :3]
+    height, width = rgb.shape[:2]
+    rows, cols = tiles
+    tile_h, tile_w = height // rows, width // cols
+
+    # Splitting axes is always possible as a view: (rows, tile_h, cols, tile_w, 3)
+    grid = rgb[:rows * tile_h, :cols * tile_w].reshape(rows, tile_h, cols, tile_w, 3)
+    tile_sums = grid.sum(axis=(1, 3), dtype=np.uint64)
+    tile_max = grid.max(axis=(1, 3))
+    tile_means = tile_sums / (tile_h * tile_w)
+
+    # Whole-frame sums reuse the tile sums; only the edge strips that do not
+    # fill a whole tile are reduced separately
+    sums = tile_sums.sum(axis=(0, 1))
+    if rows * tile_h < height:
+        sums += rgb[rows * tile_h:].sum(axis=(0, 1), dtype=np.uint64)
+    if cols * tile_w < width:
+        sums += rgb[:rows * tile_h, cols * tile_w:].sum(axis=(0, 1), dtype=np.uint64)
+    means = sums / (height * width)
+
+    histograms = np.zeros((3, 256), dtype=np.int64)
+    for top in range(0, height, HISTOGRAM_BAND_ROWS):
+        band = rgb[top:top + HISTOGRAM_BAND_ROWS]
+        for channel in range(3):
+            histograms[channel] += np.bincount(band[:, :, channel].reshape(-1), minlength=256)
+
+    return RGBAnalysis(means, histograms, tile_means, tile_max, rgb.shape)
@@ -0,0 +1,331 @@
+import argparse
+import os
+import struct
+import time
+from bisect import bisect_left
+from datetime import datetime
+import numpy as np
+
+# ---------- Session Archive Format ----------
+# A logging session is two append-only files next to each other:
+#
+#   <name>.spec  header | wavelength axis (float64 x n_pixels) | padding |
+#                one float32 row of n_pixels intensities per spectrum
+#   <name>.idx   header | padding | one INDEX_DTYPE record per spectrum
+#
+# Rows start on a 4 KiB boundary and are fixed width, so spectrum i is at
+# data_offset + i * n_pixels * 4 and the whole block maps straight onto an
+# (n_spectra, n_pixels) array. The index holds the per-spectrum metadata
+# (SpectrumRecord fields plus wall-clock time). Neither header has a count:
+# the number of spectra is whatever both files hold completely, so a session
+# cut short by a crash or power loss is still readable up to its last write.
+# All values are little-endian.
+SPEC_MAGIC = b'SPECARC1'
+INDEX_MAGIC = b'SPECIDX1'
+FORMAT_VERSION = 1
+SPEC_HEADER = struct.Struct('<8sHIId')   # magic, version, n_pixels, data_offset, created (unix time)
+INDEX_HEADER = struct.Struct('<8sHI')    # magic, version, record size
+INDEX_OFFSET = 64
+DATA_ALIGN = 4096
+ROW_DTYPE = np.dtype('<f4')
+
+# Unknown values are stored as NaN (floats) or -1 (integers, gps_valid)
+INDEX_DTYPE = np.dtype([
+    ('seq', '<i8'),
+    ('timestamp', '<f8'),       # time.monotonic() of the acquisition
+    ('wall_time', '<f8'),       # unix time of the acquisition
+    ('integration_ms', '<f4'),
+    ('dark_id', '<i4'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('altitude', '<f4'),
+    ('gps_valid', 'i1'),
+    ('temperature', '<f4'),
+    ('humidity', '<f4'),
+    ('camera_frame', '<i8'),
+])
+
+ARCHIVE_SUFFIX = '.spec'
+INDEX_SUFFIX = '.idx'
+
+
+def _data_offset(n_pixels):
+    end = SPEC_HEADER.size + n_pixels * 8
+    return (end + DATA_ALIGN - 1) // DATA_ALIGN * DATA_ALIGN
+
+
+def make_index_row(**fields):
+    # One INDEX_DTYPE record; fields left out or None are stored as unknown
+    row = np.empty((), dtype=INDEX_DTYPE)
+    for name in INDEX_DTYPE.names:
+        value = fields.get(name)
+        if value is None:
+            value = float('nan') if INDEX_DTYPE[name].kind == 'f' else -1
+        row[name] = value
+    return row
+
+
+def _index_row(record, wall_time):
+    fields = dict(zip(('seq', 'timestamp', 'integration_ms', 'dark_id', 'latitude', 'longitude',
+                       'altitude', 'gps_valid', 'temperature', 'humidity', 'camera_frame'),
+                      record.metadata()))
+    if fields['gps_valid'] is not None:
+        fields['gps_valid'] = int(fields['gps_valid'])
+    return make_index_row(wall_time=wall_time, **fields)
+
+
+# ---------- Session Archive Writer ----------
+# Appends one spectrum per call: a 4 * n_pixels byte row plus a 69 byte index
+# record, instead of ~100 KB of CSV text. Both files are written through
+# large buffers and flushed + fsynced every `sync_interval` seconds, so an SD
+# card sees a few big sequential writes a second rather than one small file
+# per spectrum. The spectrum row is always written before its index record.
+# With a DiskWriter (diskwriter.py) the row and record are queued to it as
+# one unit instead, and buffering and fsync follow that writer's policy;
+# `policy` is its overflow policy for these appends. Appends the writer
+# loses to a write error are taken off `count` (final after close()).
+class SpectrumArchiveWriter:
+    def __init__(self, path, wavelengths, sync_interval=1.0, buffer_size=1 << 20,
+                 disk_writer=None, policy=None):
+        # path without suffix, e.g. logs/session_20250523_145354
+        self.path = path
+        self.disk_writer = disk_writer
+        self.policy = policy
+        self.dropped = 0
+        self.wavelengths = np.asarray(wavelengths, dtype='<f8')
+        self.n_pixels = len(self.wavelengths)
+        self.sync_interval = sync_interval
+        self.appended = 0  # Rows written or handed to the disk writer
+        self.lost = 0      # Of those, rows the disk writer could not write
+        self.bytes_written = 0
+        self.syncs = 0
+        self.data_offset = _data_offset(self.n_pixels)
+        self.row = np.empty(self.n_pixels, dtype=ROW_DTYPE)
+        self.last_sync = time.monotonic()
+        # Offset between monotonic frame timestamps and wall-clock time
+        self.clock_offset = time.time() - time.monotonic()
+
+        self.spec_file = open(path + ARCHIVE_SUFFIX, 'xb', buffering=buffer_size)
+        try:
+            self.index_file = open(path + INDEX_SUFFIX, 'xb', buffering=buffer_size)
+        except OSError:
+            # Do not leave a .spec behind that has no index
+            self.spec_file.close()
+            os.remove(path + ARCHIVE_SUFFIX)
+            raise
+        header = SPEC_HEADER.pack(SPEC_MAGIC, FORMAT_VERSION, self.n_pixels, self.data_offset, time.time())
+        self.spec_file.write(header)
+        self.spec_file.write(self.wavelengths.tobytes())
+        self.spec_file.write(bytes(self.data_offset - len(header) - self.wavelengths.nbytes))
+        index_header = INDEX_HEADER.pack(INDEX_MAGIC, FORMAT_VERSION, INDEX_DTYPE.itemsize)
+        self.index_file.write(index_header + bytes(INDEX_OFFSET - len(index_header)))
+        self.sync()
+        if disk_writer is not None:
+            # Headers are on disk; from here on the disk writer appends
+            self.spec_file.close()
+            self.index_file.close()
+
+    def append(self, frame, record, intensities=None):
+        # intensities defaults to the processed spectrum, as the CSV logs had
+        if intensities is None:
+            intensities = frame.processed
+        return self.append_row(intensities, _index_row(record, frame.timestamp + self.clock_offset))
+
+    def append_row(self, intensities, index_row):
+        # Lower level: a spectrum and a ready-made index record (make_index_row)
+        if len(intensities) != self.n_pixels:
+            raise ValueError(f"Spectrum has {len(intensities)} pixels, archive has {self.n_pixels}")
+        self.row[:] = intensities
+        if self.disk_writer is not None:
+            writes = [(self.path + ARCHIVE_SUFFIX, self.row.data), (self.path + INDEX_SUFFIX, index_row.tobytes())]
+            if not self.disk_writer.append(writes, self.policy):
+                self.dropped += 1
+                return False
+        else:
+            self.spec_file.write(self.row.data)
+            self.index_file.write(index_row.tobytes())
+            if time.monotonic() - self.last_sync >= self.sync_interval:
+                self.sync()
+        self.appended += 1
+        self.bytes_written += self.row.nbytes + INDEX_DTYPE.itemsize
+        return True
+
+    @property
+    def count(self):
+        # Spectra in the archive (or on their way there)
+        if self.disk_writer is not None:
+            self.lost = self.disk_writer.dropped_appends(self.path + ARCHIVE_SUFFIX)
+        return self.appended - self.lost
+
+    def sync(self):
+        self.spec_file.flush()
+        self.index_file.flush()
+        os.fsync(self.spec_file.fileno())
+        os.fsync(self.index_file.fileno())
+        self.syncs += 1
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.disk_writer is not None:
+            self.disk_writer.close(self.path + ARCHIVE_SUFFIX)
+            self.disk_writer.close(self.path + INDEX_SUFFIX)
+            # Wait for the queued rows, so count is what ended up on disk
+            self.disk_writer.flush()
+            self.lost = self.disk_writer.dropped_appends(self.path + ARCHIVE_SUFFIX)
+            self.disk_writer = None
+            return
+        if self.spec_file.closed:
+            return
+        self.sync()
+        self.spec_file.close()
+        self.index_file.close()
+
+
+# ---------- Session Archive Reader ----------
+# Maps a session read-only: `spectra` is an (n_spectra, n_pixels) float32
+# view straight onto the .spec file and `index` a record view onto the .idx
+# file, so nothing is loaded until a row is touched. Time lookups binary
+# search the index's wall_time field in place (a few page reads), which
+# keeps them in the microseconds even for day-long sessions. A session that
+# is still being written can be re-mapped with refresh() to see new rows.
+class _FieldSequence:
+    # Lets bisect search one field of the index without copying it out
+    def __init__(self, index, field):
+        self.values = index[field]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return float(self.values[i])
+
+
+def _unix_time(value):
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class SpectrumArchiveReader:
+    def __init__(self, path):
+        # path with or without the .spec/.idx suffix
+        for suffix in (ARCHIVE_SUFFIX, INDEX_SUFFIX):
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+        self.path = path
+        with open(path + ARCHIVE_SUFFIX, 'rb') as file:
+            magic, version, self.n_pixels, self.data_offset, self.created = \
+                SPEC_HEADER.unpack(file.read(SPEC_HEADER.size))
+            if magic != SPEC_MAGIC:
+                raise ValueError(f"{path}{ARCHIVE_SUFFIX} is not a spectrum archive")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported archive version {version}")
+            self.wavelengths = np.frombuffer(file.read(self.n_pixels * 8), dtype='<f8')
+        with open(path + INDEX_SUFFIX, 'rb') as file:
+            magic, version, record_size = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC or record_size != INDEX_DTYPE.itemsize:
+                raise ValueError(f"{path}{INDEX_SUFFIX} is not a matching archive index")
+        self.spectra = None
+        self.index = None
+        self.refresh()
+
+    def refresh(self):
+        # Complete rows present in both files; a torn last write is ignored
+        row_bytes = self.n_pixels * ROW_DTYPE.itemsize
+        n_rows = (os.path.getsize(self.path + ARCHIVE_SUFFIX) - self.data_offset) // row_bytes
+        n_records = (os.path.getsize(self.path + INDEX_SUFFIX) - INDEX_OFFSET) // INDEX_DTYPE.itemsize
+        self.n_spectra = max(0, min(n_rows, n_records))
+        if self.n_spectra == 0:
+            self.spectra = np.empty((0, self.n_pixels), dtype=ROW_DTYPE)
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+        else:
+            self.spectra = np.memmap(self.path + ARCHIVE_SUFFIX, dtype=ROW_DTYPE, mode='r',
+                                     offset=self.data_offset, shape=(self.n_spectra, self.n_pixels))
+            self.index = np.memmap(self.path + INDEX_SUFFIX, dtype=INDEX_DTYPE, mode='r',
+                                   offset=INDEX_OFFSET, shape=(self.n_spectra,))
+        self._times = _FieldSequence(self.index, 'wall_time')
+        return self.n_spectra
+
+    def __len__(self):
+        return self.n_spectra
+
+    def __getitem__(self, key):
+        # Integer or slice into the spectra, returns views
+        return self.spectra[key]
+
+    def spectrum(self, i):
+        # (wavelengths, intensities, index record) of spectrum i
+        return self.wavelengths, self.spectra[i], self.index[i]
+
+    def read_block(self, first, last, out=None):
+        # Copies rows [first, last) with a plain read into `out` (allocated if
+        # None). For streaming a whole session: unlike walking the memmap,
+        # the pages read do not stay mapped into this process.
+        rows = last - first
+        if out is None:
+            out = np.empty((rows, self.n_pixels), dtype=ROW_DTYPE)
+        block = out[:rows]
+        with open(self.path + ARCHIVE_SUFFIX, 'rb') as file:
+            file.seek(self.data_offset + first * self.n_pixels * ROW_DTYPE.itemsize)
+            if file.readinto(block) != block.nbytes:
+                raise EOFError(f"Rows {first}-{last} are past the end of {self.path}{ARCHIVE_SUFFIX}")
+        return block
+
+    def find_time(self, t):
+        # First spectrum taken at or after `t` (unix time or datetime)
+        return bisect_left(self._times, _unix_time(t))
+
+    def nearest(self, t):
+        # Spectrum taken closest to `t`, None for an empty archive
+        if self.n_spectra == 0:
+            return None
+        t = _unix_time(t)
+        i = bisect_left(self._times, t)
+        if i == self.n_spectra or (i > 0 and t - self._times[i - 1] <= self._times[i] - t):
+            return i - 1
+        return i
+
+    def time_slice(self, start=None, end=None):
+        # slice of the spectra taken in [start, end); None leaves that side open
+        first = 0 if start is None else self.find_time(start)
+        last = self.n_spectra if end is None else self.find_time(end)
+        return slice(first, max(first, last))
+
+    def select(self, start=None, end=None):
+        # (spectra, index) views for a time range, no copying
+        window = self.time_slice(start, end)
+        return self.spectra[window], self.index[window]
+
+    def close(self):
+        self.spectra = None
+        self.index = None
+        self._times = None
+
+
+# Quick look at a session from the command line:
+#   python archive.py logs/session_20250523_145354            -> summary
+#   python archive.py logs/session_20250523_145354 --plot 10000
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect a spectrum session archive")
+    parser.add_argument('path', help="session path, with or without .spec")
+    parser.add_argument('--plot', type=int, metavar='N', help="plot spectrum number N")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    reader = SpectrumArchiveReader(args.path)
+    print(f"{reader.path}: {len(reader)} spectra x {reader.n_pixels} pixels, "
+          f"{reader.wavelengths[0]:.1f}-{reader.wavelengths[-1]:.1f} nm, "
+          f"opened in {(time.perf_counter() - started) * 1000:.2f} ms")
+    if len(reader):
+        first, last = reader.index['wall_time'][0], reader.index['wall_time'][-1]
+        print(f"From {datetime.fromtimestamp(first)} to {datetime.fromtimestamp(last)} "
+              f"({last - first:.1f} s)")
+    if args.plot is not None:
+        import matplotlib.pyplot as plt
+        started = time.perf_counter()
+        wavelengths, intensities, record = reader.spectrum(args.plot)
+        fig, ax = plt.subplots()
+        ax.plot(wavelengths, intensities)
+        print(f"Spectrum {args.plot} loaded and plotted in {(time.perf_counter() - started) * 1000:.2f} ms")
+        ax.set_title(f"Spectrum {args.plot}, {datetime.fromtimestamp(record['wall_time'])}")
+        ax.set_xlabel("Wavelength (nm)")
+        ax.set_ylabel("Intensity")
+        plt.show()
@@ -0,0 +1,311 @@
+import io
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from ratemeter import RateMeter
+
+# PyavOutput muxes in-process (picamera2 >= 0.3.19); older installs fall back
+# to FfmpegOutput, which pipes the stream into a single ffmpeg muxer process
+try:
+    from picamera2.outputs import PyavOutput
+except ImportError:
+    PyavOutput = None
+from picamera2.outputs import FfmpegOutput, Output
+
+# ---------- One-slot Mailbox ----------
+# Hands the newest frame from a producer thread to the Tk thread. A frame that
+# is replaced before anyone took it counts as dropped.
+class FrameMailbox:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frame = None
+        self.seq = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self.lock:
+            if self.frame is not None:
+                self.dropped += 1
+            self.frame = frame
+            self.seq += 1
+
+    def take(self):
+        with self.lock:
+            frame = self.frame
+            self.frame = None
+            return frame
+
+
+# ---------- Dual-stream Configuration ----------
+# One sensor mode for everything: 'main' feeds the H.264 encoder and stills,
+# 'lores' is already at display size for the preview and live analysis.
+# Recording, preview and stills then only start/stop consumers and never
+# reconfigure the camera.
+def configure_dual_stream(picam2, main_size=(1920, 1080), lores_size=(400, 400)):
+    # Pi 5 can deliver RGB on lores; the Pi 4 ISP only does YUV420 there
+    for lores_format in ("BGR888", "YUV420"):
+        config = picam2.create_video_configuration(main={"size": main_size},
+                                                   lores={"size": lores_size, "format": lores_format},
+                                                   buffer_count=6)
+        try:
+            picam2.configure(config)
+            return config
+        except Exception as e:
+            if lores_format == "YUV420":
+                raise
+            print(f"RGB lores stream not supported ({e}), using YUV420")
+
+
+def yuv420_to_rgb(array, width, height):
+    # I420 as returned by capture_array(): Y rows, then U and V planes packed
+    # two rows per array row. The array may be wider than `width` (stride).
+    stride = array.shape[1]
+    y = array[:height, :width].astype(np.float32)
+    u = array[height:height + height // 4].reshape(height // 2, stride // 2)[:, :width // 2]
+    v = array[height + height // 4:height + height // 2].reshape(height // 2, stride // 2)[:, :width // 2]
+    u = np.repeat(np.repeat(u.astype(np.float32) - 128, 2, axis=0), 2, axis=1)
+    v = np.repeat(np.repeat(v.astype(np.float32) - 128, 2, axis=0), 2, axis=1)
+    rgb = np.empty((height, width, 3), dtype=np.float32)
+    rgb[:, :, 0] = y + 1.402 * v
+    rgb[:, :, 1] = y - 0.344 * u - 0.714 * v
+    rgb[:, :, 2] = y + 1.772 * u
+    return np.clip(rgb, 0, 255).astype(np.uint8)
+
+
+# ---------- Preview Worker ----------
+# capture_array() waits for the next camera frame, so it runs here instead of
+# on the Tk thread. The stream is configured at display size, so no resize;
+# a YUV420 lores stream is converted to RGB here as well.
+class PreviewWorker:
+    def __init__(self, picam2, stream='lores', size=(400, 400)):
+        self.picam2 = picam2
+        self.stream = stream
+        self.size = size
+        self.mailbox = FrameMailbox()
+        self.running = False
+        self.thread = None
+        self.frame_rate = RateMeter()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.frame_rate.reset()
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        self.mailbox.take()
+        self.frame_rate.reset()
+
+    @property
+    def fps(self):
+        return self.frame_rate.rate
+
+    def _capture_loop(self):
+        while self.running:
+            try:
+                frame = self.picam2.capture_array(self.stream)
+                if frame.ndim == 2:
+                    frame = yuv420_to_rgb(frame, *self.size)
+            except Exception as e:
+                print(f"Preview capture error: {e}")
+                time.sleep(0.1)
+                continue
+            self.mailbox.put(frame)
+            self.frame_rate.tick()
+
+
+# ---------- Still Capture ----------
+# Stills come straight from the main stream of the running pipeline, so the
+# preview and any recording carry on. Only if the camera is idle is a one-off
+# still configuration used. The capture, JPEG encoding and file write all run
+# on a small worker pool, so the button returns immediately.
+class StillCapture:
+    def __init__(self, picam2, stream='main', max_workers=2, quality=90, disk_writer=None):
+        self.picam2 = picam2
+        self.stream = stream
+        self.quality = quality
+        self.disk_writer = disk_writer  # Optional DiskWriter; JPEG encoding stays on this pool
+        self.still_config = picam2.create_still_configuration()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="still")
+        # Only one capture may touch the camera at a time
+        self.camera_lock = threading.Lock()
+
+    def capture(self, filename, on_captured=None):
+        # on_captured(frame) runs on the worker thread with the full-res array
+        return self.pool.submit(self._capture_job, filename, on_captured)
+
+    def _grab(self):
+        with self.camera_lock:
+            if self.picam2.started:
+                return self.picam2.capture_array(self.stream)
+            # Camera idle: one-off still, leave it stopped like before
+            self.picam2.configure(self.still_config)
+            self.picam2.start()
+            try:
+                return self.picam2.capture_array()
+            finally:
+                self.picam2.stop()
+
+    def _capture_job(self, filename, on_captured):
+        try:
+            frame = self._grab()
+            if on_captured is not None:
+                on_captured(frame)
+            img = Image.fromarray(frame)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            if self.disk_writer is None:
+                img.save(filename, quality=self.quality)
+                print(f"Image saved to {filename}")
+                return
+            encoded = io.BytesIO()
+            img.save(encoded, format='JPEG', quality=self.quality)
+            if self.disk_writer.write_file(filename, encoded.getvalue()):
+                print(f"Image queued for {filename}")
+            else:
+                print(f"Disk busy, image {filename} not saved")
+        except Exception as e:
+            print(f"Error capturing still image: {e}")
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+# ---------- Video Output ----------
+# Muxes the H.264 stream into the container while recording, using the
+# encoder's frame timestamps, so the file is playable as soon as recording
+# stops. The container follows the extension (.mp4 or .mkv); MKV stays
+# readable even if the recording is cut off by a crash or power loss.
+def make_video_output(filename):
+    if PyavOutput is not None:
+        return PyavOutput(filename)
+    return FfmpegOutput(filename)
+
+
+# ---------- Pre-trigger Buffer ----------
+# Output that keeps the last few seconds of encoded H.264 in memory, bounded
+# by bytes and by age. trigger() writes the buffer to a real output (starting
+# at a keyframe) and then forwards live frames to it, so a recording starts
+# with no delay and no gap. release() closes that file and goes back to
+# buffering. Everything else about the encoder keeps running.
+# trigger() can take a while (opening the file, writing up to max_bytes), so
+# call it off the GUI thread. It does not hold the lock while writing: frames
+# that arrive meanwhile are queued and written after the buffer, so the
+# encoder callback never waits for the flush.
+class PretriggerOutput(Output):
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_seconds=10):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.max_us = max_seconds * 1000000
+        self.frames = deque()  # (data, keyframe, timestamp)
+        self.buffered_bytes = 0
+        self.destination = None
+        self.flushing = None      # destination the buffer is being written to
+        self.backlog = []         # frames that arrived during the flush
+        self.release_requested = False
+        self.streams = []
+        self.lock = threading.Lock()
+
+    def _add_stream(self, *args, **kwargs):
+        # Stream setup from the encoder, replayed on the real output
+        self.streams.append((args, kwargs))
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        with self.lock:
+            if self.destination is not None:
+                self.destination.outputframe(frame, keyframe, timestamp, packet, audio)
+                return
+            if audio:
+                return
+            if self.flushing is not None:
+                self.backlog.append((bytes(frame), keyframe, timestamp))
+                return
+            # The encoder reuses its buffer after this call returns
+            data = bytes(frame)
+            self.frames.append((data, keyframe, timestamp))
+            self.buffered_bytes += len(data)
+            while self.frames and (self.buffered_bytes > self.max_bytes or
+                                   timestamp - self.frames[0][2] > self.max_us):
+                self.buffered_bytes -= len(self.frames.popleft()[0])
+
+    def buffered_seconds(self):
+        with self.lock:
+            if len(self.frames) < 2:
+                return 0.0
+            return (self.frames[-1][2] - self.frames[0][2]) / 1000000
+
+    def trigger(self, destination):
+        with self.lock:
+            if self.destination is not None or self.flushing is not None:
+                return False
+            # A decodable file has to start on a keyframe
+            while self.frames and not self.frames[0][1]:
+                self.frames.popleft()
+            frames = list(self.frames)
+            self.frames.clear()
+            self.buffered_bytes = 0
+            self.flushing = destination
+            self.release_requested = False
+        try:
+            destination.start()
+            for args, kwargs in self.streams:
+                destination._add_stream(*args, **kwargs)
+            while True:
+                for data, keyframe, timestamp in frames:
+                    destination.outputframe(data, keyframe, timestamp)
+                with self.lock:
+                    frames, self.backlog = self.backlog, []
+                    if not frames:
+                        # Caught up: live frames go straight to the file from here
+                        self.flushing = None
+                        released = self.release_requested
+                        if not released:
+                            self.destination = destination
+                        break
+        except Exception:
+            with self.lock:
+                self.flushing = None
+                self.backlog = []
+            destination.stop()
+            raise
+        if released:
+            # release() came in while the buffer was being written
+            destination.stop()
+        return True
+
+    def release(self):
+        with self.lock:
+            if self.flushing is not None:
+                self.release_requested = True  # trigger() closes it when done
+                return
+            destination = self.destination
+            self.destination = None
+        if destination is not None:
+            destination.stop()
+
+    def stop(self):
+        # Encoder stopped: close any file we were still writing
+        self.release()
+        super().stop()
+
+
+# ---------- Camera Frame Counter ----------
+# Installed as picam2.post_callback: numbers every frame the camera delivers
+# and publishes the number as 'camera', so spectra can be matched to frames.
+class CameraFrameCounter:
+    def __init__(self, bus):
+        self.bus = bus
+        self.count = 0
+
+    def __call__(self, request):
+        self.count += 1
+        self.bus.publish('camera', self.count)
@@ -0,0 +1,177 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from archive import SpectrumArchiveWriter, make_index_row
+
+# ---------- Legacy CSV Import ----------
+# Turns the old one-file-per-spectrum CSVs (spectrum_*.csv from Save Data,
+# log_*.csv from logging) into one session archive:
+#   python csv_import.py imported spectra/ logs/ old/spectrum_20250523_144607.csv
+# Files are parsed in a process pool and written in time order (from the
+# timestamp in the file name). Their wavelength axes are not all the same:
+# some files miss the first pixels (3644 instead of 3648 rows) and some were
+# saved with 7 decimals instead of full precision. Every spectrum is put on
+# one canonical axis: by pixel offset when its wavelengths line up with the
+# axis within `tolerance` nm, by linear interpolation when they do not.
+# Pixels a file does not cover are NaN.
+# The canonical axis is taken from --axis, or else from the first file with
+# the most pixels seen (the spectrometer's 3648).
+# <output>.sources.csv lists which file became which row and how it was aligned.
+FILE_PATTERN = re.compile(r'(?:spectrum|log)_(\d{8}_\d{6})\.csv$')
+SPECTROMETER_PIXELS = 3648
+
+def file_time(path):
+    # Unix time from the name, None if the name has no timestamp
+    match = FILE_PATTERN.search(os.path.basename(path))
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+
+
+def parse_csv(path):
+    # (wavelengths, intensities) from a Wavelength,Intensity file. One C-level
+    # number parse for the whole file instead of a Python loop per row.
+    with open(path, 'rb') as file:
+        data = file.read()
+    body = data[data.index(b'\n') + 1:].strip()
+    values = np.fromstring(body.replace(b'\n', b','), sep=',')
+    rows = body.count(b'\n') + 1
+    if values.size != 2 * rows:
+        raise ValueError(f"expected {rows} rows of 2 numbers, parsed {values.size} numbers")
+    values = values.reshape(rows, 2)
+    return values[:, 0].copy(), values[:, 1].copy()
+
+
+def _parse_job(path):
+    # Runs in a worker process; errors come back as text so one bad file
+    # does not end the import
+    try:
+        wavelengths, intensities = parse_csv(path)
+        return path, wavelengths, intensities, None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+
+def align(axis, wavelengths, intensities, tolerance=1e-3):
+    # (row on `axis`, first pixel, method); method is 'offset' or 'interp'
+    row = np.full(len(axis), np.nan)
+    first = int(np.abs(axis - wavelengths[0]).argmin())
+    last = first + len(wavelengths)
+    if last <= len(axis) and np.abs(axis[first:last] - wavelengths).max() <= tolerance:
+        row[first:last] = intensities
+        return row, first, 'offset'
+    order = np.argsort(wavelengths)
+    row[:] = np.interp(axis, wavelengths[order], intensities[order], left=np.nan, right=np.nan)
+    return row, first, 'interp'
+
+
+def load_axis(path):
+    # Canonical axis from a CSV file or an existing archive
+    if path.endswith('.csv'):
+        return parse_csv(path)[0]
+    from archive import SpectrumArchiveReader
+    return np.array(SpectrumArchiveReader(path).wavelengths)
+
+
+def find_csv_files(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in os.listdir(item):
+                if FILE_PATTERN.search(name):
+                    paths.append(os.path.join(item, name))
+        else:
+            paths.append(item)
+    # Time order from the name; files without a timestamp go last, by name
+    return sorted(paths, key=lambda p: (file_time(p) is None, file_time(p) or 0, os.path.basename(p)))
+
+
+class ImportStats:
+    __slots__ = ('files', 'imported', 'failed', 'bytes_read', 'methods', 'seconds')
+
+    def __init__(self):
+        self.files = 0
+        self.imported = 0
+        self.failed = 0
+        self.bytes_read = 0
+        self.methods = {'offset': 0, 'interp': 0}
+        self.seconds = 0.0
+
+    def report(self):
+        rate = self.files / self.seconds if self.seconds else 0.0
+        mb_rate = self.bytes_read / 1e6 / self.seconds if self.seconds else 0.0
+        return (f"{self.imported} of {self.files} files imported in {self.seconds:.2f} s "
+                f"({rate:.0f} files/s, {mb_rate:.1f} MB/s); aligned by offset: {self.methods['offset']}, "
+                f"interpolated: {self.methods['interp']}, failed: {self.failed}")
+
+
+def import_csv_files(paths, output, axis=None, workers=None, tolerance=1e-3, chunksize=16):
+    # Writes <output>.spec/.idx/.sources.csv and returns ImportStats
+    stats = ImportStats()
+    stats.files = len(paths)
+    started = time.perf_counter()
+    archive = None
+    waiting = []  # Parsed before the canonical axis was known
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(output + '.sources.csv', 'w') as sources:
+        sources.write("row,file,first_pixel,n_pixels,method\n")
+
+        def write(path, wavelengths, intensities):
+            row, first, method = align(axis, wavelengths, intensities, tolerance)
+            wall_time = file_time(path)
+            archive.append_row(row, make_index_row(seq=archive.count, wall_time=wall_time))
+            sources.write(f"{archive.count - 1},{path},{first},{len(wavelengths)},{method}\n")
+            stats.methods[method] += 1
+            stats.imported += 1
+
+        for path, wavelengths, intensities, error in pool.map(_parse_job, paths, chunksize=chunksize):
+            stats.bytes_read += os.path.getsize(path)
+            if error is not None:
+                print(f"Skipping {path}: {error}")
+                stats.failed += 1
+                continue
+            if archive is None:
+                waiting.append((path, wavelengths, intensities))
+                if axis is None and len(wavelengths) < SPECTROMETER_PIXELS:
+                    continue  # Keep looking for a file with the full axis
+                if axis is None:
+                    axis = wavelengths
+                archive = SpectrumArchiveWriter(output, axis)
+                for item in waiting:
+                    write(*item)
+                waiting = []
+                continue
+            write(path, wavelengths, intensities)
+
+        if archive is None and waiting:
+            # No full-length file at all: use the longest one seen
+            axis = max((item[1] for item in waiting), key=len)
+            archive = SpectrumArchiveWriter(output, axis)
+            for item in waiting:
+                write(*item)
+    if archive is not None:
+        archive.close()
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import legacy spectrum/log CSV files into one session archive")
+    parser.add_argument('output', help="archive path without suffix, e.g. logs/imported_may")
+    parser.add_argument('inputs', nargs='+', help="CSV files and/or directories holding them")
+    parser.add_argument('--axis', help="CSV file or archive whose wavelength axis is canonical")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--tolerance', type=float, default=1e-3, help="nm allowed between matching pixels")
+    args = parser.parse_args()
+
+    paths = find_csv_files(args.inputs)
+    if not paths:
+        parser.error("no spectrum_*.csv or log_*.csv files found")
+    axis = load_axis(args.axis) if args.axis else None
+    stats = import_csv_files(paths, args.output, axis, args.workers, args.tolerance)
+    print(stats.report())
+    print(f"Archive written to {args.output}.spec")
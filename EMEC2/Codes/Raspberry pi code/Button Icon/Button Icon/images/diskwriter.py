@@ -0,0 +1,332 @@
+import os
+import threading
+import time
+from collections import deque
+from ratemeter import RateMeter
+
+# ---------- Disk Writer ----------
+# One thread does all file I/O for the GUI, the logger and the camera, so a
+# slow or stalling SD card only ever holds up this thread. Callers queue a
+# job and return immediately:
+#   append(writes)            -> [(path, bytes), ...] appended as one unit
+#   write_file(path, content) -> whole file; content is bytes or a callable
+#                                content(file) that writes into the open file
+#   close(path)               -> flush, fsync and close an appended file
+# The writer takes every job that is waiting (up to `batch_bytes`) at once
+# and joins the appends per file into a single write() each. Whole files
+# are written to <path>.part and renamed, so nobody sees half a file.
+# The files of one append job stay in step: if writing one of them fails,
+# all of the job's files are cut back to where the batch started, so the
+# batch's appends to them are lost as a whole and the next batch tries
+# again. Only if that fails too (or a file cannot be cut back) do the files
+# take no more appends until they are closed. dropped_appends(path) tells
+# the caller how many of its appends to a path were lost this way.
+#
+# When the queue is full the overflow policy decides, per writer or per call:
+#   'block'       wait for space (up to `block_timeout`, then drop the job)
+#   'drop_oldest' discard the oldest queued append/file job
+#   'drop_newest' discard the job being queued
+# fsync policy: 'always' after every batch, 'interval' at most every
+# `fsync_interval` seconds, 'never' leaves it to the kernel.
+POLICIES = ('block', 'drop_oldest', 'drop_newest')
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+class WriteJob:
+    __slots__ = ('kind', 'path', 'writes', 'content', 'nbytes', 'queued_at', 'done')
+
+    def __init__(self, kind, path=None, writes=(), content=None, nbytes=0):
+        self.kind = kind          # 'append', 'file', 'close' or 'barrier'
+        self.path = path
+        self.writes = writes
+        self.content = content
+        self.nbytes = nbytes
+        self.queued_at = time.monotonic()
+        self.done = None          # threading.Event for flush()
+
+
+def _write_all(file, data):
+    # Unbuffered files can write less than asked, e.g. on a nearly full card
+    view = memoryview(data)
+    while view:
+        written = file.write(view)
+        if not written:
+            raise OSError(f"wrote 0 of {len(view)} bytes")
+        view = view[written:]
+
+
+class DiskWriter:
+    def __init__(self, maxsize=256, policy='block', block_timeout=None, batch_bytes=4 << 20,
+                 fsync='interval', fsync_interval=1.0, latency_history=500):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.batch_bytes = batch_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.files = {}      # path -> open file for appends
+        self.dirty = set()   # appended paths not fsynced yet
+        self.failing = set()  # paths whose last batch failed; one more failure and...
+        self.failed = set()   # ...appends are refused until close()
+        self.append_drops = {}  # path -> appends lost to write errors
+        self.last_fsync = time.monotonic()
+        self.running = False
+        self.thread = None
+        # Metrics
+        self.latencies = deque(maxlen=latency_history)  # seconds from queueing to written
+        self.max_depth = 0
+        self.jobs_written = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.fsyncs = 0
+        self.byte_meter = RateMeter()
+
+    def dropped_appends(self, path):
+        return self.append_drops.get(path, 0)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Writes out everything still queued, then closes all files
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Called from any thread
+    def append(self, writes, policy=None):
+        writes = [(path, bytes(data)) for path, data in writes]
+        job = WriteJob('append', writes=writes, nbytes=sum(len(data) for _, data in writes))
+        return self._put(job, policy)
+
+    def write_file(self, path, content, policy=None):
+        nbytes = len(content) if isinstance(content, (bytes, bytearray)) else 0
+        return self._put(WriteJob('file', path=path, content=content, nbytes=nbytes), policy)
+
+    def close(self, path):
+        return self._put(WriteJob('close', path=path), 'block')
+
+    def flush(self, timeout=None):
+        # Waits until everything queued before this call is on disk
+        job = WriteJob('barrier')
+        job.done = threading.Event()
+        self._put(job, 'block')
+        return job.done.wait(timeout)
+
+    @property
+    def bytes_per_second(self):
+        return self.byte_meter.rate
+
+    @property
+    def depth(self):
+        return len(self.queue)
+
+    def latency_percentiles(self, percentiles=(50, 99)):
+        # Queue-to-disk time in ms over the recent history, None before the first write
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        last = len(latencies) - 1
+        return tuple(latencies[round(last * p / 100)] * 1000 for p in percentiles)
+
+    def _put(self, job, policy):
+        # True if queued, False if this job was dropped
+        policy = policy or self.policy
+        with self.cond:
+            if not self.running:
+                raise RuntimeError("Disk writer is not running")
+            if len(self.queue) >= self.maxsize:
+                if policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                if policy == 'drop_oldest':
+                    # Only data is dropped; close/flush jobs are tiny and must run
+                    for i, queued in enumerate(self.queue):
+                        if queued.kind in ('append', 'file'):
+                            del self.queue[i]
+                            self.dropped += 1
+                            break
+                else:
+                    deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+                    while len(self.queue) >= self.maxsize:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self.cond.wait(remaining)
+            self.queue.append(job)
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.cond.notify_all()
+        return True
+
+    def _take_batch(self):
+        with self.cond:
+            if self.running and not self.queue:
+                # Wake up when idle too, for interval fsyncs
+                self.cond.wait(min(self.fsync_interval, 1.0))
+            batch = []
+            nbytes = 0
+            while self.queue and (not batch or nbytes + self.queue[0].nbytes <= self.batch_bytes):
+                job = self.queue.popleft()
+                batch.append(job)
+                nbytes += job.nbytes
+            self.cond.notify_all()  # Room for blocked producers
+            return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._take_batch()
+            if not batch and not self.running and not self.queue:
+                break
+            self._write_batch(batch)
+            if self.fsync == 'always' or (self.fsync == 'interval' and
+                                          time.monotonic() - self.last_fsync >= self.fsync_interval):
+                self._fsync_dirty()
+        if self.fsync != 'never':
+            self._fsync_dirty()
+        for file in self.files.values():
+            file.close()
+        self.files.clear()
+
+    def _write_batch(self, batch):
+        # Appends to the same file are joined into one write; the first file
+        # touched is written first, so an archive row still lands before its
+        # index record. Other jobs run at their place in the queue.
+        pending = {}
+        linked = {}  # path -> paths it shares an append job with
+        for job in batch:
+            if job.kind == 'append':
+                if any(path in self.failed for path, _ in job.writes):
+                    self.dropped += 1
+                    for path, _ in job.writes:
+                        self._count_append_drops(path, 1)
+                    continue
+                paths = {path for path, _ in job.writes}
+                for path, data in job.writes:
+                    pending.setdefault(path, []).append(data)
+                    linked.setdefault(path, set()).update(paths)
+                continue
+            self._write_appends(pending, linked)
+            pending = {}
+            linked = {}
+            if job.kind == 'file':
+                self._write_whole_file(job)
+            elif job.kind == 'close':
+                self._close_file(job.path)
+        self._write_appends(pending, linked)
+
+        now = time.monotonic()
+        for job in batch:
+            if job.kind in ('append', 'file'):
+                self.latencies.append(now - job.queued_at)
+                self.jobs_written += 1
+            elif job.kind == 'barrier':
+                if self.fsync != 'never':
+                    self._fsync_dirty()
+                job.done.set()
+        self._count_bytes(sum(job.nbytes for job in batch), now)
+
+    def _write_appends(self, pending, linked):
+        # When one file fails, the files it shares jobs with (e.g. an
+        # archive's rows and its index) are cut back to their size before
+        # this batch, or not written at all if they come later.
+        starts = {}  # path -> size before this batch
+        skipped = set()
+        for path, chunks in pending.items():
+            if path in skipped:
+                continue
+            try:
+                file = self.files.get(path)
+                if file is None:
+                    file = self.files[path] = open(path, 'ab', buffering=0)
+                starts[path] = os.fstat(file.fileno()).st_size
+                _write_all(file, b"".join(chunks))
+                self.dirty.add(path)
+            except OSError as e:
+                self.errors += 1
+                group = linked[path]
+                skipped.update(group)
+                clean = all(self._truncate(other, starts[other]) for other in group if other in starts)
+                for other in group:
+                    self._count_append_drops(other, len(pending.get(other, ())))
+                if clean and not group & self.failing:
+                    self.failing.update(group)
+                    print(f"Error writing {path}, {len(chunks)} appends lost, retrying with the next batch: {e}")
+                else:
+                    self.failed.update(group)
+                    print(f"Error writing {path}, no more appends until it is closed: {e}")
+        # A clean batch clears an earlier failure
+        self.failing.difference_update(path for path in pending if path not in skipped)
+
+    def _truncate(self, path, size):
+        # Drops the part of a failed batch that did get written; False if
+        # that did not work either
+        try:
+            self.files[path].truncate(size)
+            return True
+        except (OSError, KeyError) as e:
+            print(f"Error truncating {path}: {e}")
+            return False
+
+    def _count_append_drops(self, path, n):
+        self.append_drops[path] = self.append_drops.get(path, 0) + n
+
+    def _write_whole_file(self, job):
+        part = job.path + '.part'
+        try:
+            with open(part, 'wb') as file:
+                if callable(job.content):
+                    job.content(file)
+                else:
+                    file.write(job.content)
+                job.nbytes = file.tell()
+                file.flush()
+                if self.fsync != 'never':
+                    os.fsync(file.fileno())
+                    self.fsyncs += 1
+            os.replace(part, job.path)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error writing {job.path}: {e}")
+
+    def _close_file(self, path):
+        self.failed.discard(path)
+        self.failing.discard(path)
+        file = self.files.pop(path, None)
+        if file is None:
+            return
+        try:
+            if self.fsync != 'never':
+                os.fsync(file.fileno())
+                self.fsyncs += 1
+            file.close()
+        except OSError as e:
+            self.errors += 1
+            print(f"Error closing {path}: {e}")
+        self.dirty.discard(path)
+
+    def _fsync_dirty(self):
+        for path in self.dirty:
+            try:
+                os.fsync(self.files[path].fileno())
+                self.fsyncs += 1
+            except (OSError, KeyError) as e:
+                self.errors += 1
+                print(f"Error syncing {path}: {e}")
+        self.dirty.clear()
+        self.last_fsync = time.monotonic()
+
+    def _count_bytes(self, nbytes, now):
+        self.bytes_written += nbytes
+        self.byte_meter.tick(nbytes, now)
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+from archive import SpectrumArchiveReader
+
+# pyarrow is only needed for exporting; the GUI and logger never import this
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# ---------- Columnar Export ----------
+# Writes a session archive as one Parquet (or Arrow IPC) file for analysis
+# in pandas/polars/DuckDB instead of opening CSVs by hand:
+#   python export.py logs/session_20250523_145354 session.parquet
+# One row per spectrum. Metadata, GPS and environment readings are plain
+# columns (unknown values are nulls) and the spectrum is a fixed-size list
+# column `intensities` of float32, one value per pixel. The wavelength axis
+# is stored once in the schema metadata ('wavelengths', JSON list).
+# Rows are read from the archive one row group at a time into the same
+# buffer and written out, so memory use stays at about one row group of
+# spectra however large the session is.
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Exporting needs pyarrow (pip install pyarrow)")
+
+
+def export_schema(wavelengths):
+    _require_pyarrow()
+    n_pixels = len(wavelengths)
+    fields = [
+        pa.field('seq', pa.int64()),
+        pa.field('time', pa.timestamp('us', tz='UTC')),
+        pa.field('integration_ms', pa.float32()),
+        pa.field('dark_id', pa.int32()),
+        pa.field('latitude', pa.float64()),
+        pa.field('longitude', pa.float64()),
+        pa.field('altitude', pa.float32()),
+        pa.field('gps_valid', pa.bool_()),
+        pa.field('temperature', pa.float32()),
+        pa.field('humidity', pa.float32()),
+        pa.field('camera_frame', pa.int64()),
+        pa.field('intensities', pa.list_(pa.float32(), n_pixels)),
+    ]
+    metadata = {
+        'wavelengths': json.dumps([float(w) for w in wavelengths]),
+        'n_pixels': str(n_pixels),
+        'wavelength_unit': 'nm',
+    }
+    return pa.schema(fields, metadata=metadata)
+
+
+def _record_batch(schema, spectra, index):
+    # One row group: unknown values (NaN / -1 in the archive) become nulls
+    def floats(name, arrow_type):
+        values = index[name]
+        return pa.array(values, type=arrow_type, mask=np.isnan(values))
+
+    def ints(name, arrow_type):
+        values = index[name]
+        return pa.array(values, type=arrow_type, mask=values < 0)
+
+    gps_valid = index['gps_valid']
+    wall_time = np.round(index['wall_time'] * 1e6)
+    intensities = spectra.reshape(-1)
+    columns = [
+        pa.array(index['seq'], type=pa.int64()),
+        pa.array(wall_time.astype(np.int64), type=pa.timestamp('us', tz='UTC'), mask=np.isnan(wall_time)),
+        floats('integration_ms', pa.float32()),
+        ints('dark_id', pa.int32()),
+        floats('latitude', pa.float64()),
+        floats('longitude', pa.float64()),
+        floats('altitude', pa.float32()),
+        pa.array(gps_valid > 0, type=pa.bool_(), mask=gps_valid < 0),
+        floats('temperature', pa.float32()),
+        floats('humidity', pa.float32()),
+        ints('camera_frame', pa.int64()),
+        pa.FixedSizeListArray.from_arrays(pa.array(intensities, type=pa.float32()), spectra.shape[1]),
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def export_session(archive_path, output, fmt='parquet', rows_per_group=1024, compression='zstd',
+                   start=None, end=None):
+    # Returns the number of spectra written; start/end limit the time range
+    _require_pyarrow()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    reader = SpectrumArchiveReader(archive_path)
+    window = reader.time_slice(start, end)
+    schema = export_schema(reader.wavelengths)
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(output, schema, compression=compression)
+        write = lambda batch: writer.write_table(pa.Table.from_batches([batch]), row_group_size=len(batch))
+    else:
+        writer = pa.ipc.new_file(output, schema)
+        write = writer.write_batch
+    rows = 0
+    buffer = np.empty((rows_per_group, reader.n_pixels), dtype=np.float32)
+    try:
+        for first in range(window.start, window.stop, rows_per_group):
+            last = min(first + rows_per_group, window.stop)
+            spectra = reader.read_block(first, last, buffer)
+            write(_record_batch(schema, spectra, np.array(reader.index[first:last])))
+            rows += last - first
+    finally:
+        writer.close()
+        reader.close()
+    return rows
+
+
+def _parse_time(text):
+    return None if text is None else datetime.fromisoformat(text)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a spectrum session archive to Parquet or Arrow")
+    parser.add_argument('archive', help="session path, with or without .spec")
+    parser.add_argument('output', help="output file, e.g. session.parquet")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                        help="default: from the output extension (.arrow/.feather -> arrow)")
+    parser.add_argument('--rows-per-group', type=int, default=1024)
+    parser.add_argument('--compression', default='zstd', help="Parquet codec: zstd, snappy, gzip or none")
+    parser.add_argument('--start', help="first time to export, ISO format (local time)")
+    parser.add_argument('--end', help="end of the time range, ISO format (local time)")
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'arrow' if args.output.endswith(('.arrow', '.feather')) else 'parquet'
+    started = time.perf_counter()
+    rows = export_session(args.archive, args.output, fmt, args.rows_per_group,
+                          None if args.compression == 'none' else args.compression,
+                          _parse_time(args.start), _parse_time(args.end))
+    elapsed = time.perf_counter() - started
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"{rows} spectra exported to {args.output} ({size_mb:.1f} MB) in {elapsed:.2f} s "
+          f"({rows / elapsed if elapsed else 0:.0f} spectra/s)")
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+import serial
+import pynmea2
+
+# ---------- GPS Fix Record ----------
+# One record per position epoch (GGA or RMC). Fields that the receiver only
+# reports in other sentences (VTG speed/heading, GSA DOP/fix type) carry the
+# most recent value seen before the epoch. None means not reported yet.
+class GPSFix:
+    __slots__ = ('timestamp', 'utc', 'latitude', 'longitude', 'altitude', 'fix_quality',
+                 'num_sats', 'hdop', 'pdop', 'vdop', 'fix_type', 'speed_kmh', 'course', 'valid')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def copy(self, **changes):
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return GPSFix(**fields)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- GPS Reader ----------
+# Blocks in serial.read() (with a timeout so stop() is honoured) instead of
+# polling, keeps partial lines between reads, and reopens the port with
+# backoff if it disappears. Works against any serial device, including the
+# pty that gps_replay.py creates.
+class GPSReader:
+    def __init__(self, port='/dev/ttyS0', baudrate=9600, history=3600, max_backoff=30.0, bus=None):
+        self.port = port
+        self.bus = bus  # Optional TelemetryBus, fixes go out as 'gps'
+        self.baudrate = baudrate
+        self.max_backoff = max_backoff
+        self.history = deque(maxlen=history)  # GPSFix records, oldest first
+        self.latest_fix = None
+        self.state = GPSFix()
+        self.sentences = 0
+        self.parse_errors = 0
+        self.reconnects = 0
+        self.connected = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def latest(self):
+        return self.latest_fix
+
+    def _read_loop(self):
+        backoff = 1.0
+        while not self.stop_event.is_set():
+            try:
+                with serial.Serial(self.port, self.baudrate, timeout=0.5) as ser:
+                    self.connected = True
+                    backoff = 1.0
+                    self._read_port(ser)
+            except (serial.SerialException, OSError) as e:
+                print(f"GPS port {self.port} unavailable: {e}")
+            except Exception as e:
+                # Anything else would end the thread and leave 'gps' stale
+                print(f"Error reading GPS: {e}")
+            self.connected = False
+            if self.stop_event.is_set():
+                break
+            self.reconnects += 1
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _read_port(self, ser):
+        pending = b""
+        while not self.stop_event.is_set():
+            # Waits for at least one byte, then takes whatever else has arrived
+            chunk = ser.read(max(1, ser.in_waiting))
+            if not chunk:
+                continue
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()  # Incomplete last line, finished by a later read
+            if len(pending) > 1024:
+                pending = b""  # Garbage without newlines, e.g. wrong baud rate
+            for line in lines:
+                self.handle_sentence(line.decode('ascii', errors='replace').strip())
+
+    def handle_sentence(self, line):
+        if not line.startswith('$'):
+            return
+        try:
+            msg = pynmea2.parse(line)
+        except pynmea2.ParseError:
+            self.parse_errors += 1
+            return
+        self.sentences += 1
+        kind = msg.sentence_type
+        state = self.state
+        # pynmea2 also accepts sentences without a checksum, so a garbled
+        # field can still get here and only fail when it is converted
+        try:
+            if kind == 'GGA':
+                quality = _int(msg.gps_qual)
+                state = state.copy(utc=msg.timestamp, fix_quality=quality, num_sats=_int(msg.num_sats),
+                                   hdop=_float(msg.horizontal_dil), altitude=_float(msg.altitude),
+                                   valid=bool(quality))
+                if quality:
+                    state = state.copy(latitude=msg.latitude, longitude=msg.longitude)
+            elif kind == 'RMC':
+                valid = msg.status == 'A'
+                state = state.copy(utc=msg.timestamp, valid=valid)
+                if valid:
+                    speed_knots = _float(msg.spd_over_grnd)
+                    state = state.copy(latitude=msg.latitude, longitude=msg.longitude,
+                                       speed_kmh=speed_knots * 1.852 if speed_knots is not None else None,
+                                       course=_float(msg.true_course))
+            elif kind == 'VTG':
+                state = state.copy(speed_kmh=_float(msg.spd_over_grnd_kmph), course=_float(msg.true_track))
+            elif kind == 'GSA':
+                state = state.copy(fix_type=_int(msg.mode_fix_type), pdop=_float(msg.pdop),
+                                   hdop=_float(msg.hdop), vdop=_float(msg.vdop))
+            else:
+                return
+        except (ValueError, TypeError, AttributeError):
+            self.parse_errors += 1
+            return
+        self.state = state
+        if kind in ('GGA', 'RMC'):
+            fix = state.copy(timestamp=time.monotonic())
+            # GGA and RMC of the same epoch make one record, not two
+            if self.history and fix.utc is not None and self.history[-1].utc == fix.utc:
+                self.history[-1] = fix
+            else:
+                self.history.append(fix)
+            self.latest_fix = fix
+            if self.bus is not None:
+                self.bus.publish('gps', fix, fix.timestamp)
@@ -0,0 +1,40 @@
+import argparse
+import os
+import time
+import tty
+
+# ---------- NMEA Replay ----------
+# Creates a pseudo-terminal and replays an NMEA log into it, so GPSReader can
+# be run and tested without a receiver:
+#   python gps_replay.py track.nmea --rate 10
+#   GPSReader(port=<printed path>).start()
+# Lines are sent in chunks that split sentences on purpose, to exercise the
+# partial-line handling. The log loops until Ctrl+C.
+def replay(path, rate=5.0, chunk=17, loop=True):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(f"Replaying {path} on {os.ttyname(slave)}")
+    with open(path, 'rb') as f:
+        lines = [line.strip() + b"\r\n" for line in f if line.strip()]
+    try:
+        while True:
+            for line in lines:
+                for i in range(0, len(line), chunk):
+                    os.write(master, line[i:i + chunk])
+                time.sleep(1.0 / rate)
+            if not loop:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay an NMEA log on a pseudo-terminal")
+    parser.add_argument('log', help="NMEA log file, one sentence per line")
+    parser.add_argument('--rate', type=float, default=5.0, help="sentences per second")
+    parser.add_argument('--once', action='store_true', help="stop at the end of the log")
+    args = parser.parse_args()
+    replay(args.log, args.rate, loop=not args.once)
@@ -0,0 +1,129 @@
+import numpy as np
+from ratemeter import RateMeter
+
+# ---------- Min/Max Decimation ----------
+# Reduces a spectrum to one (min, max) pair per display column so a 3648 point
+# frame becomes ~2 * n_columns points without losing narrow emission peaks.
+# Column boundaries come from the wavelength axis and are computed once; use one
+# decimator per axis and share it between the live plot, waterfall and overlays.
+class MinMaxDecimator:
+    def __init__(self, wavelengths, n_columns=400):
+        x = np.asarray(wavelengths, dtype=np.float64)
+        self.source = wavelengths
+        self.n_pixels = len(x)
+        edges = np.linspace(x[0], x[-1], n_columns + 1)
+        columns = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_columns - 1)
+        # First pixel of every non-empty column, as reduceat wants it
+        self.starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        ends = np.r_[self.starts[1:], len(x)] - 1
+        n = len(self.starts)
+        # Min and max are drawn as a vertical stroke at the column centre
+        self.x = np.repeat((x[self.starts] + x[ends]) / 2, 2)
+        self.y = np.empty(2 * n)
+
+    def decimate(self, intensities):
+        # Returns views of internal buffers, valid until the next call
+        np.minimum.reduceat(intensities, self.starts, out=self.y[0::2])
+        np.maximum.reduceat(intensities, self.starts, out=self.y[1::2])
+        return self.x, self.y
+
+    def decimate_rows(self, block):
+        # (n_spectra x n_pixels) -> (n_spectra x 2 * n_columns), for waterfall/overlay views
+        block = np.asarray(block)
+        out = np.empty((block.shape[0], len(self.y)))
+        np.minimum.reduceat(block, self.starts, axis=1, out=out[:, 0::2])
+        np.maximum.reduceat(block, self.starts, axis=1, out=out[:, 1::2])
+        return self.x, out
+
+
+# ---------- Blitted Spectrum Renderer ----------
+# The line, title, labels and legend are created once. A normal update only
+# restores the cached axes background, draws the line and blits the axes box;
+# a full canvas.draw() happens only when the axis limits have to change.
+class SpectrumRenderer:
+    def __init__(self, canvas, ax, title='Spectral Intensity vs. Wavelength',
+                 xlabel='Wavelength (nm)', ylabel='Intensity', margin=0.1, shrink=0.5):
+        self.canvas = canvas
+        self.ax = ax
+        # Limits get `margin` of the data span as headroom, and are only
+        # tightened again once the data fills less than `shrink` of the view
+        self.margin = margin
+        self.shrink = shrink
+        self.line, = ax.plot([], [], label='Spectrum', animated=True)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        self.background = None
+        self.xlim = None
+        self.ylim = None
+        self.frame_rate = RateMeter()
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        # Any full redraw (limits, window expose) invalidates the background
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def _limits_changed(self, x, y):
+        changed = False
+        x0, x1 = x[0], x[-1]
+        if self.xlim != (x0, x1):
+            self.xlim = (x0, x1)
+            self.ax.set_xlim(x0, x1)
+            changed = True
+        lo, hi = np.min(y), np.max(y)
+        span = max(hi - lo, 1e-9)
+        if self.ylim is not None:
+            y0, y1 = self.ylim
+            inside = y0 <= lo and hi <= y1
+            if inside and span >= self.shrink * (y1 - y0):
+                return changed
+        self.ylim = (lo - self.margin * span, hi + self.margin * span)
+        self.ax.set_ylim(self.ylim)
+        return True
+
+    def update(self, x, y):
+        self.line.set_data(x, y)
+        if self._limits_changed(x, y) or self.background is None:
+            # draw_event recaptures the background and draws the line
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.line)
+            self.canvas.blit(self.ax.bbox)
+        self.frame_rate.tick()
+
+    @property
+    def fps(self):
+        return self.frame_rate.rate
+
+
+# ---------- RGB Intensity Plot ----------
+# Stems and markers for the three channel means, created once and updated
+# in place instead of rgb_ax.clear() on every capture.
+RGB_WAVELENGTHS = (635, 530, 470)  # Red, green, blue (nm)
+
+class RGBRenderer:
+    def __init__(self, canvas, ax):
+        self.canvas = canvas
+        self.ax = ax
+        self.stems = []
+        self.markers = []
+        for wavelength, color, label in zip(RGB_WAVELENGTHS, ('red', 'green', 'blue'), ('Red', 'Green', 'Blue')):
+            stem, = ax.plot([wavelength, wavelength], [0, 0], color=color, label=label)
+            marker, = ax.plot([wavelength], [0], 'o', color=color)
+            self.stems.append(stem)
+            self.markers.append(marker)
+        ax.set_title('Average RGB Intensity vs. Wavelength')
+        ax.set_xlabel('Wavelength (nm)')
+        ax.set_ylabel('Average Intensity')
+        ax.set_xlim([150, 925])
+
+    def update(self, means):
+        # means in R, G, B order, as returned by analyse_frame()
+        for stem, marker, value in zip(self.stems, self.markers, means):
+            stem.set_ydata([0, value])
+            marker.set_ydata([value])
+        self.ax.set_ylim([0, max(max(means) * 1.1, 1)])
+        self.canvas.draw_idle()
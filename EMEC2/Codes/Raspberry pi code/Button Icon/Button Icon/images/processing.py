@@ -0,0 +1,106 @@
+import threading
+import numpy as np
+
+# ---------- Processing Stages ----------
+# Every stage has apply(src, out): read src, write the result into out. src and
+# out are always different arrays of length n_pixels. Anything that depends
+# only on the wavelength axis is computed once in __init__.
+
+class DarkSubtraction:
+    def __init__(self, dark_intensities, dark_id=None):
+        self.dark = np.array(dark_intensities, dtype=np.float64)
+        self.dark_id = dark_id  # Recorded with every frame it was subtracted from
+
+    def apply(self, src, out):
+        np.subtract(src, self.dark, out=out)
+
+
+class BaselineCorrection:
+    # Same method as the old button: 2nd order polynomial fitted through the
+    # points at or below the 10th percentile, refitted on every frame
+    def __init__(self, wavelengths, percentile=10, order=2):
+        n = len(wavelengths)
+        self.k = int((n - 1) * percentile / 100)
+        # Centred/scaled axis keeps the Vandermonde matrix well conditioned
+        x = np.asarray(wavelengths, dtype=np.float64)
+        x = (x - x.mean()) / (np.ptp(x) / 2)
+        self.vander = np.vander(x, order + 1)
+        self.scratch = np.empty(n)
+        self.mask = np.empty(n, dtype=bool)
+        self.baseline = np.empty(n)
+
+    def apply(self, src, out):
+        np.copyto(self.scratch, src)
+        self.scratch.partition(self.k)
+        np.less_equal(src, self.scratch[self.k], out=self.mask)
+        coefficients = np.linalg.lstsq(self.vander[self.mask], src[self.mask], rcond=None)[0]
+        np.dot(self.vander, coefficients, out=self.baseline)
+        np.subtract(src, self.baseline, out=out)
+
+
+class MovingAverage:
+    # Running-sum moving average. Output keeps the full length so it stays
+    # aligned with the wavelength axis; the window//2 edge pixels pass through.
+    def __init__(self, n_pixels, window_size=5):
+        self.window = window_size
+        self.half = window_size // 2
+        self.csum = np.zeros(n_pixels + 1)
+
+    def apply(self, src, out):
+        w, h = self.window, self.half
+        n = len(src)
+        np.cumsum(src, out=self.csum[1:])
+        valid = out[h:h + n - w + 1]
+        np.subtract(self.csum[w:], self.csum[:-w], out=valid)
+        valid *= 1.0 / w
+        out[:h] = src[:h]
+        out[h + n - w + 1:] = src[h + n - w + 1:]
+
+
+# ---------- Processing Pipeline ----------
+# Applies the enabled stages to each frame in a fixed order. Intermediate
+# results ping-pong between two preallocated buffers, so a frame costs no
+# allocations beyond the small baseline fit.
+STAGE_ORDER = ['dark', 'baseline', 'smooth']
+
+class ProcessingPipeline:
+    def __init__(self, n_pixels):
+        self.n_pixels = n_pixels
+        self.order = list(STAGE_ORDER)
+        self.enabled = {}
+        self.stages = ()
+        self.buffers = (np.empty(n_pixels), np.empty(n_pixels))
+        self.lock = threading.Lock()
+
+    def set_stage(self, name, stage):
+        # stage=None disables it. Stages not in STAGE_ORDER run after the others.
+        with self.lock:
+            if name not in self.order:
+                self.order.append(name)
+            if stage is None:
+                self.enabled.pop(name, None)
+            else:
+                self.enabled[name] = stage
+            # Swapped in as a whole so process() never sees a half-updated list
+            self.stages = tuple(self.enabled[n] for n in self.order if n in self.enabled)
+
+    def get_stage(self, name):
+        return self.enabled.get(name)
+
+    def dark_id(self, stages):
+        dark = self.enabled.get('dark')
+        return dark.dark_id if dark is not None and dark in stages else None
+
+    def process(self, src, out):
+        # Returns the stages that were applied, for the frame's bookkeeping
+        stages = self.stages
+        if not stages:
+            np.copyto(out, src)
+            return stages
+        current = src
+        last = len(stages) - 1
+        for i, stage in enumerate(stages):
+            target = out if i == last else self.buffers[i % 2]
+            stage.apply(current, target)
+            current = target
+        return stages
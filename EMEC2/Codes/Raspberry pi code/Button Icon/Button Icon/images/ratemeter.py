@@ -0,0 +1,40 @@
+import time
+
+# ---------- Rate Meter ----------
+# Events (frames, writes, bytes) per second for the status labels. tick(n)
+# counts n events; every `window` seconds or more the count is divided by
+# the time it took and started again. Reading `rate` also looks at the
+# clock: once no tick has closed a window for two windows, it reports what
+# came in since the last one, so a source that stopped (spectrometer
+# unplugged, capture stalled) falls towards 0 instead of showing its last
+# rate forever.
+class RateMeter:
+    __slots__ = ('window', 'total', '_rate', '_count', '_start')
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.total = 0
+        self.reset()
+
+    def reset(self):
+        self._rate = 0.0
+        self._count = 0
+        self._start = time.monotonic()
+
+    def tick(self, n=1, now=None):
+        self.total += n
+        self._count += n
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._start
+        if elapsed >= self.window:
+            self._rate = self._count / elapsed
+            self._count = 0
+            self._start = now
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self._start
+        if elapsed >= 2 * self.window:
+            return self._count / elapsed
+        return self._rate
@@ -0,0 +1,411 @@
+import struct
+import threading
+import time
+from collections import deque
+import serial
+from ratemeter import RateMeter
+
+# ---------- Rover Protocol ----------
+# Every frame, in both directions, is 8 bytes:
+#   0xA5 | opcode | seq | left speed (int16 LE) | right speed (int16 LE) | CRC-8
+# The CRC (polynomial 0x07) covers opcode..right speed. Speeds are signed PWM
+# values, -255 (full reverse) to 255 (full forward). OP_DRIVE speeds are
+# targets: the Arduino ramps each side towards them by itself. It answers each
+# good frame with an OP_ACK carrying the same seq and the speeds it applied.
+# If no frame arrives for WATCHDOG_TIMEOUT while the motors run, the Arduino
+# stops them by itself and sends OP_WATCHDOG, seq = number of such stops.
+# Must match GUIArduino.ino.
+SYNC = 0xA5
+OP_DRIVE = 0x01
+OP_HEARTBEAT = 0x02
+OP_ACK = 0x80
+OP_WATCHDOG = 0x81
+WATCHDOG_TIMEOUT = 0.5
+RAMP_STEP = 5          # Arduino ramp: at most this much per side ...
+RAMP_INTERVAL = 0.01   # ... every 10 ms
+FRAME_BODY = struct.Struct('<BBhh')  # opcode, seq, left, right
+FRAME_SIZE = FRAME_BODY.size + 2
+DEFAULT_BAUDRATE = 115200
+
+def _crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+CRC8_TABLE = _crc8_table()
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_frame(opcode, seq, left=0, right=0):
+    body = FRAME_BODY.pack(opcode, seq & 0xFF, left, right)
+    return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+
+class FrameParser:
+    # Turns a byte stream into (opcode, seq, left, right) tuples. A frame with
+    # a bad CRC costs only its sync byte, then the parser looks for the next one.
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.crc_errors = 0
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        while True:
+            start = buffer.find(SYNC)
+            if start < 0:
+                buffer.clear()
+                break
+            if start:
+                del buffer[:start]
+            if len(buffer) < FRAME_SIZE:
+                break
+            body = bytes(buffer[1:FRAME_SIZE - 1])
+            if crc8(body) != buffer[FRAME_SIZE - 1]:
+                self.crc_errors += 1
+                del buffer[0]
+                continue
+            frames.append(FRAME_BODY.unpack(body))
+            self.frames += 1
+            del buffer[:FRAME_SIZE]
+        return frames
+
+
+# ---------- Rover Link ----------
+# Owns the serial port to the Arduino. The GUI only drops commands into the
+# outbound slot and returns; this thread does the (possibly slow) writes and
+# a reader thread matches the ACKs to measure round-trip time.
+#   - direction, speed and steering changes coalesce into one left/right
+#     setpoint, sent at most `setpoint_rate` times a second and only if it
+#     differs from the last one sent, so dragging a slider does not flood
+#     the link
+#   - hold()/release() keep the link busy at `setpoint_rate` until the
+#     button or key is let go, so the rover only moves while it is held.
+#     A hold also ends by itself unless the GUI calls keep_holding() within
+#     `hold_timeout`, so a lost key release (window lost focus) or a stalled
+#     GUI stops the rover like a dropped link does
+#   - otherwise a heartbeat goes out every `heartbeat_interval`; the Arduino
+#     watchdog stops the motors when both stop arriving
+#   - a frame without an ACK after `ack_timeout` is counted as lost
+# The port is reopened with backoff if it disappears.
+
+# (left, right) wheel directions per D-pad command, same as the old ASCII commands
+DIRECTIONS = {
+    'forward': (1, 1),
+    'backward': (-1, -1),
+    'left': (1, -1),
+    'right': (-1, 1),
+    'stop': (0, 0),
+}
+
+def mix_setpoint(direction, speed, steering):
+    # (left, right) speeds for a D-pad direction. Steering (-1 to 1) slows one
+    # side and speeds up the other while driving forward or backward; positive
+    # steering leans towards the D-pad's 'right' wheel pattern. Turning on the
+    # spot and stopping ignore it.
+    left, right = DIRECTIONS[direction]
+    if left == right != 0 and steering:
+        turn_left, turn_right = DIRECTIONS['right']
+        left += steering * turn_left
+        right += steering * turn_right
+    return (max(-255, min(255, round(left * speed))),
+            max(-255, min(255, round(right * speed))))
+
+class RoverLink:
+    def __init__(self, port='/dev/ttyACM0', baudrate=DEFAULT_BAUDRATE, max_backoff=10.0,
+                 write_timeout=1.0, heartbeat_interval=0.2, setpoint_rate=20.0,
+                 ack_timeout=0.5, rtt_history=500, hold_timeout=0.3):
+        self.port = port
+        self.baudrate = baudrate
+        self.max_backoff = max_backoff
+        self.write_timeout = write_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.setpoint_period = 1.0 / setpoint_rate
+        self.ack_timeout = ack_timeout
+        self.hold_timeout = hold_timeout
+        self.cond = threading.Condition()
+        self.direction = 'stop'
+        self.speed = 128
+        self.steering = 0.0
+        self.dirty = False  # Setpoint inputs changed since the last DRIVE frame
+        self.last_sent = None  # (left, right) of the last DRIVE frame
+        self.streaming = False  # True while a D-pad button or key is held
+        self.hold_deadline = 0.0  # monotonic() at which an unrefreshed hold ends
+        self.seq = 0
+        self.outstanding = {}  # seq -> (perf_counter() when sent, opcode)
+        self.rtts = deque(maxlen=rtt_history)  # seconds, newest last
+        self.applied = (0, 0)  # speeds the Arduino last acknowledged
+        self.running = False
+        self.connected = False
+        self.link_error = False
+        self.thread = None
+        # Counters
+        self.writes = 0
+        self.bytes_written = 0
+        self.coalesced = 0
+        self.acks = 0
+        self.lost = 0
+        self.setpoints = 0
+        self.unchanged = 0  # Setpoint updates that were not sent, nothing changed
+        self.heartbeats = 0
+        self.missed_heartbeats = 0
+        self.watchdog_stops = 0  # Reported by the Arduino
+        self.expired_holds = 0  # Holds ended because the GUI stopped refreshing them
+        self.write_errors = 0
+        self.crc_errors = 0
+        self.write_meter = RateMeter()
+        self.byte_meter = RateMeter()
+        self.setpoint_meter = RateMeter()
+        self._last_write = 0.0
+        self._last_setpoint = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._link_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    # Called from the GUI thread; never blocks on the port
+    def send_direction(self, command):
+        if command not in DIRECTIONS:
+            raise ValueError(f"Unknown direction: {command}")
+        with self.cond:
+            self.direction = command
+            self._mark_dirty()
+
+    def hold(self, command):
+        # Drive while held: the setpoint is repeated until release()
+        if command not in DIRECTIONS:
+            raise ValueError(f"Unknown direction: {command}")
+        with self.cond:
+            self.direction = command
+            self.streaming = command != 'stop'
+            self.hold_deadline = time.monotonic() + self.hold_timeout
+            self._mark_dirty()
+
+    def keep_holding(self):
+        # Called by the GUI while the button or key is still down
+        with self.cond:
+            if self.streaming:
+                self.hold_deadline = time.monotonic() + self.hold_timeout
+
+    def release(self):
+        with self.cond:
+            self.direction = 'stop'
+            self.streaming = False
+            self._mark_dirty()
+
+    def set_speed(self, speed):
+        with self.cond:
+            self.speed = max(0, min(255, int(speed)))
+            self._mark_dirty()
+
+    def set_steering(self, steering):
+        with self.cond:
+            self.steering = max(-1.0, min(1.0, float(steering)))
+            self._mark_dirty()
+
+    def setpoint(self):
+        return mix_setpoint(self.direction, self.speed, self.steering)
+
+    def _mark_dirty(self):
+        if self.dirty:
+            self.coalesced += 1
+        self.dirty = True
+        self.cond.notify()
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        # Round-trip times in ms over the recent history, None before the first ACK
+        rtts = sorted(self.rtts)
+        if not rtts:
+            return None
+        last = len(rtts) - 1
+        return tuple(rtts[round(last * p / 100)] * 1000 for p in percentiles)
+
+    def _next_frame(self):
+        with self.cond:
+            while self.running and not self.link_error:
+                now = time.monotonic()
+                if self.streaming and now >= self.hold_deadline:
+                    # Nobody is holding the button any more, as far as we know
+                    self.expired_holds += 1
+                    self.direction = 'stop'
+                    self.streaming = False
+                    self._mark_dirty()
+                setpoint_due = self._last_setpoint + self.setpoint_period
+                if self.dirty and now >= setpoint_due:
+                    self.dirty = False
+                    setpoint = self.setpoint()
+                    if setpoint != self.last_sent:
+                        return OP_DRIVE, setpoint[0], setpoint[1]
+                    self.unchanged += 1
+                # Keep the watchdog fed; faster while a button is held
+                interval = self.setpoint_period if self.streaming else self.heartbeat_interval
+                due = self._last_write + interval
+                if now >= due:
+                    return OP_HEARTBEAT, 0, 0
+                if self.dirty:
+                    due = min(due, setpoint_due)
+                if self.streaming:
+                    due = min(due, self.hold_deadline)
+                self.cond.wait(due - now)
+        return None
+
+    @property
+    def writes_per_second(self):
+        return self.write_meter.rate
+
+    @property
+    def bytes_per_second(self):
+        return self.byte_meter.rate
+
+    @property
+    def setpoints_per_second(self):
+        return self.setpoint_meter.rate
+
+    def _count_write(self, opcode, n_bytes):
+        self.writes += 1
+        self.bytes_written += n_bytes
+        now = time.monotonic()
+        self._last_write = now
+        self.write_meter.tick(1, now)
+        self.byte_meter.tick(n_bytes, now)
+        if opcode == OP_DRIVE:
+            self.setpoints += 1
+            self._last_setpoint = now
+        else:
+            self.heartbeats += 1
+        # Ticked for heartbeats too, so the setpoint rate shows 0 while idle
+        self.setpoint_meter.tick(int(opcode == OP_DRIVE), now)
+
+    def _expire_outstanding(self, now):
+        with self.cond:
+            expired = [seq for seq, (sent, _) in self.outstanding.items() if now - sent > self.ack_timeout]
+            for seq in expired:
+                opcode = self.outstanding.pop(seq)[1]
+                if opcode == OP_HEARTBEAT:
+                    self.missed_heartbeats += 1
+                else:
+                    # The setpoint may not have arrived, send it again
+                    self.last_sent = None
+                    self._mark_dirty()
+            self.lost += len(expired)
+
+    def _read_loop(self, ser):
+        parser = FrameParser()
+        while self.running and not self.link_error:
+            try:
+                chunk = ser.read(max(1, ser.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                print(f"Rover link {self.port} read failed: {e}")
+                with self.cond:
+                    self.link_error = True
+                    self.cond.notify()
+                break
+            if not chunk:
+                continue
+            received = time.perf_counter()
+            for opcode, seq, left, right in parser.feed(chunk):
+                if opcode == OP_WATCHDOG:
+                    print(f"Rover watchdog stopped the motors (stop #{seq})")
+                    with self.cond:
+                        self.watchdog_stops += 1
+                        self.applied = (0, 0)
+                        # Only a held button drives on once the link is back
+                        if not self.streaming:
+                            self.direction = 'stop'
+                        self.last_sent = None
+                        self._mark_dirty()
+                    continue
+                if opcode != OP_ACK:
+                    continue
+                with self.cond:
+                    sent = self.outstanding.pop(seq, None)
+                self.acks += 1
+                self.applied = (left, right)
+                if sent is not None:
+                    self.rtts.append(received - sent[0])
+            self.crc_errors = parser.crc_errors
+
+    def _write_frames(self, ser):
+        while True:
+            message = self._next_frame()
+            if message is None:
+                break
+            opcode, left, right = message
+            self.seq = (self.seq + 1) & 0xFF
+            data = encode_frame(opcode, self.seq, left, right)
+            started = time.perf_counter()
+            with self.cond:
+                if self.seq in self.outstanding:
+                    self.lost += 1  # Wrapped around without an ACK
+                self.outstanding[self.seq] = (started, opcode)
+                if opcode == OP_DRIVE:
+                    self.last_sent = (left, right)
+            ser.write(data)
+            # Wait until it is on the wire; meanwhile new commands coalesce
+            # here instead of queueing in the kernel buffer. USB CDC and ptys
+            # return from flush() early, so pace to the line rate (10 bits per
+            # byte) ourselves.
+            ser.flush()
+            remaining = len(data) * 10 / self.baudrate - (time.perf_counter() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+            self._count_write(opcode, len(data))
+            self._expire_outstanding(time.perf_counter())
+
+    def _link_loop(self):
+        backoff = 0.5
+        while self.running:
+            reader = None
+            try:
+                with serial.Serial(self.port, self.baudrate, timeout=0.1,
+                                   write_timeout=self.write_timeout) as ser:
+                    with self.cond:
+                        self.link_error = False
+                        self.outstanding.clear()
+                        # The Arduino may have reset. Only a held button resumes
+                        # driving; a latched command was ended by the watchdog.
+                        if not self.streaming:
+                            self.direction = 'stop'
+                        self.last_sent = None
+                        self._mark_dirty()
+                    self._last_write = 0.0
+                    self._last_setpoint = 0.0
+                    self.connected = True
+                    backoff = 0.5
+                    reader = threading.Thread(target=self._read_loop, args=(ser,), daemon=True)
+                    reader.start()
+                    self._write_frames(ser)
+                    with self.cond:
+                        self.link_error = True  # Tells the reader to finish
+                    reader.join(timeout=1.0)
+            except (serial.SerialException, OSError) as e:
+                self.write_errors += 1
+                print(f"Rover link {self.port} unavailable: {e}")
+                if reader is not None:
+                    with self.cond:
+                        self.link_error = True
+                    reader.join(timeout=1.0)
+            self.connected = False
+            if self.running:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
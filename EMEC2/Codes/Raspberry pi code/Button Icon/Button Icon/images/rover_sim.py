@@ -0,0 +1,197 @@
+import argparse
+import os
+import select
+import threading
+import time
+import tty
+from rover import (DEFAULT_BAUDRATE, OP_ACK, OP_DRIVE, OP_WATCHDOG, RAMP_INTERVAL, RAMP_STEP,
+                   WATCHDOG_TIMEOUT, FrameParser, RoverLink, encode_frame)
+
+# ---------- Arduino Simulator ----------
+# Stands in for GUIArduino.ino on a pseudo-terminal: reads what the Pi sends
+# at the speed a real UART would drain it (10 bits per byte at `baudrate`),
+# ramps the motor speeds towards the setpoints, ACKs every frame and runs the
+# same dead-man watchdog, so RoverLink can be run and benchmarked without the
+# rover:
+#   python rover_sim.py            -> prints the port, then every command
+#   python rover_sim.py --bench    -> drives a RoverLink against it
+class ArduinoSimulator:
+    def __init__(self, baudrate=DEFAULT_BAUDRATE, verbose=False):
+        self.baudrate = baudrate
+        self.verbose = verbose
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.parser = FrameParser()
+        self.left = 0
+        self.right = 0
+        self.target_left = 0
+        self.target_right = 0
+        self.last_ramp = time.monotonic()
+        self.drive_frames = 0
+        self.commands = 0
+        self.bytes_received = 0
+        self.last_frame = time.monotonic()
+        self.watchdog_stops = 0
+        self.watchdog_stopped_at = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._serial_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def handle_frame(self, opcode, seq, left, right):
+        self.commands += 1
+        self.last_frame = time.monotonic()
+        if opcode == OP_DRIVE:
+            self.drive_frames += 1
+            self.target_left = max(-255, min(255, left))
+            self.target_right = max(-255, min(255, right))
+        if self.verbose:
+            print(f"op {opcode:#04x} seq {seq:3d} -> target {self.target_left:4d} / {self.target_right:4d}")
+        # The UART is full duplex, so sending the ACK does not hold up reading
+        os.write(self.master, encode_frame(OP_ACK, seq, self.left, self.right))
+
+    def ramp(self):
+        now = time.monotonic()
+        steps = int((now - self.last_ramp) / RAMP_INTERVAL)
+        if steps:
+            self.last_ramp += steps * RAMP_INTERVAL
+            limit = steps * RAMP_STEP
+            self.left += max(-limit, min(limit, self.target_left - self.left))
+            self.right += max(-limit, min(limit, self.target_right - self.right))
+
+    def check_watchdog(self):
+        driving = self.left or self.right or self.target_left or self.target_right
+        if driving and time.monotonic() - self.last_frame > WATCHDOG_TIMEOUT:
+            self.left = self.right = self.target_left = self.target_right = 0
+            self.watchdog_stops += 1
+            self.watchdog_stopped_at = time.monotonic()
+            if self.verbose:
+                print("watchdog: no frames, motors stopped")
+            try:
+                os.write(self.master, encode_frame(OP_WATCHDOG, self.watchdog_stops, 0, 0))
+            except OSError:
+                pass  # Nobody has the port open any more
+
+    def _serial_loop(self):
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.01)
+            self.check_watchdog()
+            self.ramp()
+            if not readable:
+                continue
+            try:
+                chunk = os.read(self.master, 64)
+            except OSError:
+                break
+            self.bytes_received += len(chunk)
+            # Hold the line as long as the real UART would take for these bytes
+            time.sleep(len(chunk) * 10 / self.baudrate)
+            for frame in self.parser.feed(chunk):
+                self.handle_frame(*frame)
+
+
+def hold_for(link, seconds):
+    # What the GUI's refresh_hold() does while a button is down
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        link.keep_holding()
+        time.sleep(0.1)
+
+
+def benchmark(baudrate=DEFAULT_BAUDRATE, seconds=5.0, rate=200):
+    sim = ArduinoSimulator(baudrate)
+    sim.start()
+    link = RoverLink(sim.port, baudrate)
+    link.start()
+    directions = ('forward', 'left', 'forward', 'right')
+    calls = 0
+    worst_call = 0.0
+    end = time.monotonic() + seconds
+    # Emulates a user dragging the speed slider and mashing the D-pad
+    while time.monotonic() < end:
+        t0 = time.perf_counter()
+        link.set_speed(calls % 256)
+        link.send_direction(directions[calls % len(directions)])
+        worst_call = max(worst_call, time.perf_counter() - t0)
+        calls += 1
+        time.sleep(1.0 / rate)
+    link.send_direction('stop')
+    time.sleep(0.5)
+    link.stop()
+    print(f"GUI calls:       {calls * 2} ({rate * 2}/s), slowest {worst_call * 1000:.3f} ms")
+    print(f"Serial writes:   {link.writes} ({link.writes / seconds:.1f}/s), {link.bytes_written} bytes")
+    print(f"Coalesced:       {link.coalesced}")
+    print(f"ACKs:            {link.acks}, lost {link.lost}, CRC errors {link.crc_errors}")
+    latency = link.latency_percentiles()
+    if latency is not None:
+        print("Round trip:      p50 {:.2f} ms, p90 {:.2f} ms, p99 {:.2f} ms".format(*latency))
+    time.sleep(0.6)  # Let the ramp finish
+    print(f"Arduino got:     {sim.commands} frames, final speeds {sim.left} / {sim.right}")
+
+    # Dead-man test: hold forward, then lose the Pi side without a stop command
+    link = RoverLink(sim.port, baudrate)
+    link.start()
+    link.hold('forward')
+    hold_for(link, 1.5)
+    print(f"Holding:         {link.writes_per_second:.1f} frames/s, "
+          f"{link.missed_heartbeats} missed heartbeats, speeds {sim.left} / {sim.right}")
+    # Steering sweep while driving, like dragging the slider back and forth
+    drive_frames = sim.drive_frames
+    sweep_start = time.monotonic()
+    updates = 0
+    while time.monotonic() - sweep_start < 2.0:
+        link.set_steering(((updates % 200) - 100) / 100)
+        link.keep_holding()
+        updates += 1
+        time.sleep(0.002)
+    sent = sim.drive_frames - drive_frames
+    print(f"Steering sweep:  {updates} slider updates -> {sent} setpoints sent "
+          f"({sent / 2.0:.1f}/s), speeds {sim.left} / {sim.right}")
+    # Stalled GUI: the button is still "held" but nothing refreshes the hold
+    stalled_at = time.monotonic()
+    while sim.left and time.monotonic() - stalled_at < 2.0:
+        time.sleep(0.005)
+    print(f"GUI stall stop:  {(time.monotonic() - stalled_at) * 1000:.0f} ms, "
+          f"{link.expired_holds} expired holds, {sim.watchdog_stops} watchdog stops")
+    link.set_steering(0)
+    link.hold('forward')
+    hold_for(link, 0.6)
+    link.stop()
+    lost_at = time.monotonic()
+    while sim.left and time.monotonic() - lost_at < 2.0:
+        time.sleep(0.005)
+    if sim.watchdog_stopped_at is not None:
+        print(f"Dead-man stop:   {(sim.watchdog_stopped_at - lost_at) * 1000:.0f} ms after the link went quiet")
+    else:
+        print("Dead-man stop:   motors still running!")
+    sim.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulated rover Arduino on a pseudo-terminal")
+    parser.add_argument('--baudrate', type=int, default=DEFAULT_BAUDRATE)
+    parser.add_argument('--bench', action='store_true', help="benchmark RoverLink against the simulator")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.baudrate, args.seconds)
+    else:
+        sim = ArduinoSimulator(args.baudrate, verbose=True)
+        print(f"Simulated Arduino on {sim.port}")
+        sim.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            sim.stop()
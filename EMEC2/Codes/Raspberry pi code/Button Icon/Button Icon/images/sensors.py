@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+from collections import deque
+import board
+import adafruit_dht
+
+# ---------- DHT11 Sampler ----------
+# The DHT11 needs at least 2 s between reads and fails a read every so often
+# (checksum / timing errors). Reading happens on this thread only; the GUI
+# asks for the cached last good value and how old it is.
+DHT11_MIN_PERIOD = 2.0
+
+class DHT11Reading:
+    __slots__ = ('temperature', 'humidity')
+
+    def __init__(self, temperature, humidity):
+        self.temperature = temperature  # degC
+        self.humidity = humidity        # %RH
+
+
+class DHT11Sampler:
+    def __init__(self, pin=board.D4, period=DHT11_MIN_PERIOD, max_backoff=30.0, bus=None):
+        self.pin = pin
+        self.bus = bus  # Optional TelemetryBus, good reads go out as 'dht11'
+        self.period = max(period, DHT11_MIN_PERIOD)
+        self.max_backoff = max_backoff
+        self.sensor = None
+        self.temperature = None
+        self.humidity = None
+        self.timestamp = None  # time.monotonic() of the last good read
+        self.reads = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def latest(self):
+        # (temperature, humidity, age in seconds) or None before the first good read
+        with self.lock:
+            if self.timestamp is None:
+                return None
+            return self.temperature, self.humidity, time.monotonic() - self.timestamp
+
+    def _next_delay(self):
+        if self.consecutive_errors == 0:
+            return self.period
+        # Back off exponentially from the minimum period while reads keep failing
+        return min(self.period * 2 ** (self.consecutive_errors - 1), self.max_backoff)
+
+    def _sample_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.sensor is None:
+                    self.sensor = adafruit_dht.DHT11(self.pin)
+                temperature = self.sensor.temperature
+                humidity = self.sensor.humidity
+                if temperature is None or humidity is None:
+                    raise RuntimeError("DHT11 returned no data")
+                with self.lock:
+                    self.temperature = temperature
+                    self.humidity = humidity
+                    self.timestamp = time.monotonic()
+                    self.reads += 1
+                    self.consecutive_errors = 0
+                if self.bus is not None:
+                    self.bus.publish('dht11', DHT11Reading(temperature, humidity), self.timestamp)
+            except RuntimeError:
+                # Normal for a DHT11, just try again later
+                with self.lock:
+                    self.errors += 1
+                    self.consecutive_errors += 1
+            except Exception as e:
+                print(f"Error reading DHT11 data: {e}")
+                with self.lock:
+                    self.errors += 1
+                    self.consecutive_errors += 1
+                # Start over with a fresh sensor object
+                if self.sensor is not None:
+                    self.sensor.exit()
+                    self.sensor = None
+            self.stop_event.wait(self._next_delay())
+        if self.sensor is not None:
+            self.sensor.exit()
+            self.sensor = None
+
+
+# ---------- System Telemetry ----------
+# Reads CPU temperature, CPU/memory counters and throttling state straight
+# from /sys and /proc. The files are opened once and re-read with pread(),
+# so a sample costs a few syscalls instead of forking vcgencmd.
+THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+THROTTLED_PATH = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+
+# Bits of the firmware get_throttled value
+THROTTLE_UNDER_VOLTAGE = 0x1
+THROTTLE_FREQ_CAPPED = 0x2
+THROTTLE_THROTTLED = 0x4
+THROTTLE_SOFT_TEMP_LIMIT = 0x8
+
+class SystemSample:
+    __slots__ = ('timestamp', 'cpu_temp', 'cpu_percent', 'core_percent', 'mem_used_mb',
+                 'mem_total_mb', 'mem_percent', 'disk_free_gb', 'disk_percent', 'throttled')
+
+    def __init__(self, timestamp, cpu_temp, cpu_percent, core_percent, mem_used_mb,
+                 mem_total_mb, mem_percent, disk_free_gb, disk_percent, throttled):
+        self.timestamp = timestamp        # time.monotonic()
+        self.cpu_temp = cpu_temp          # degC, None if not available
+        self.cpu_percent = cpu_percent    # all cores
+        self.core_percent = core_percent  # tuple, one value per core
+        self.mem_used_mb = mem_used_mb
+        self.mem_total_mb = mem_total_mb
+        self.mem_percent = mem_percent
+        self.disk_free_gb = disk_free_gb
+        self.disk_percent = disk_percent
+        self.throttled = throttled        # get_throttled bits, None if not available
+
+    @property
+    def under_voltage(self):
+        return bool(self.throttled and self.throttled & THROTTLE_UNDER_VOLTAGE)
+
+    @property
+    def throttling(self):
+        return bool(self.throttled and self.throttled & (THROTTLE_FREQ_CAPPED | THROTTLE_THROTTLED))
+
+
+def _open_optional(path):
+    try:
+        return os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+
+class SystemTelemetry:
+    def __init__(self, period=1.0, history=600, disk_path='/', bus=None):
+        self.period = period
+        self.bus = bus  # Optional TelemetryBus, samples go out as 'system'
+        self.disk_path = disk_path
+        self.history = deque(maxlen=history)  # Ring of SystemSample, oldest first
+        self.latest_sample = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.thermal_fd = _open_optional(THERMAL_PATH)
+        self.throttled_fd = _open_optional(THROTTLED_PATH)
+        self.stat_fd = os.open("/proc/stat", os.O_RDONLY)
+        self.meminfo_fd = os.open("/proc/meminfo", os.O_RDONLY)
+        self.prev_cpu = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def latest(self):
+        return self.latest_sample
+
+    def _read_cpu_times(self):
+        # (busy, total) jiffies for the 'cpu' line and each 'cpuN' line
+        times = []
+        for line in os.pread(self.stat_fd, 16384, 0).split(b"\n"):
+            if not line.startswith(b"cpu"):
+                break
+            fields = [int(v) for v in line.split()[1:]]
+            idle = fields[3] + fields[4]  # idle + iowait
+            total = sum(fields[:8])       # guest time is already in user/nice
+            times.append((total - idle, total))
+        return times
+
+    def _cpu_percent(self):
+        current = self._read_cpu_times()
+        previous, self.prev_cpu = self.prev_cpu, current
+        if previous is None:
+            return 0.0, tuple(0.0 for _ in current[1:])
+        percents = []
+        for (busy, total), (prev_busy, prev_total) in zip(current, previous):
+            elapsed = total - prev_total
+            percents.append(100.0 * (busy - prev_busy) / elapsed if elapsed > 0 else 0.0)
+        return percents[0], tuple(percents[1:])
+
+    def _memory(self):
+        values = {}
+        for line in os.pread(self.meminfo_fd, 4096, 0).split(b"\n"):
+            key, _, rest = line.partition(b":")
+            if key in (b"MemTotal", b"MemAvailable"):
+                values[key] = int(rest.split()[0])  # kB
+                if len(values) == 2:
+                    break
+        total = values[b"MemTotal"]
+        used = total - values[b"MemAvailable"]
+        return used / 1024, total / 1024, 100.0 * used / total
+
+    def sample(self):
+        cpu_percent, core_percent = self._cpu_percent()
+        mem_used, mem_total, mem_percent = self._memory()
+        disk = os.statvfs(self.disk_path)
+        disk_total = disk.f_blocks * disk.f_frsize
+        disk_free = disk.f_bavail * disk.f_frsize
+        disk_used = disk_total - disk.f_bfree * disk.f_frsize
+        disk_percent = 100.0 * disk_used / (disk_used + disk_free) if disk_total else 0.0
+        cpu_temp = None
+        if self.thermal_fd is not None:
+            cpu_temp = int(os.pread(self.thermal_fd, 32, 0)) / 1000
+        throttled = None
+        if self.throttled_fd is not None:
+            throttled = int(os.pread(self.throttled_fd, 32, 0), 16)
+        return SystemSample(time.monotonic(), cpu_temp, cpu_percent, core_percent, mem_used,
+                            mem_total, mem_percent, disk_free / 1024 ** 3, disk_percent, throttled)
+
+    def _sample_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                sample = self.sample()
+                self.history.append(sample)
+                self.latest_sample = sample
+                if self.bus is not None:
+                    self.bus.publish('system', sample, sample.timestamp)
+            except Exception as e:
+                print(f"Error reading system telemetry: {e}")
+            self.stop_event.wait(self.period)
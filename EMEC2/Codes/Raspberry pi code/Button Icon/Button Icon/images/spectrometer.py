@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+import seabreeze.spectrometers as sb
+from processing import ProcessingPipeline
+
+# ---------- Spectrum Ring Buffer ----------
+# Preallocated (depth x n_pixels) blocks that the acquisition thread writes
+# into: raw intensities and the processing pipeline output for the same frame.
+# Nothing is allocated per frame; readers get views of the slots.
+class SpectrumRing:
+    def __init__(self, n_pixels, depth=64):
+        self.depth = depth
+        self.n_pixels = n_pixels
+        self.data = np.zeros((depth, n_pixels), dtype=np.float64)
+        self.processed = np.zeros((depth, n_pixels), dtype=np.float64)
+        self.timestamps = np.zeros(depth, dtype=np.float64)
+        self.count = 0  # Total number of frames written so far
+        # Read-only row views handed out to subscribers, created once
+        self.views = self._readonly_rows(self.data)
+        self.processed_views = self._readonly_rows(self.processed)
+
+    def _readonly_rows(self, block):
+        views = []
+        for slot in range(self.depth):
+            view = block[slot]
+            view.flags.writeable = False
+            views.append(view)
+        return views
+
+    def write(self, intensities, timestamp, pipeline=None):
+        slot = self.count % self.depth
+        self.data[slot, :] = intensities
+        dark_id = None
+        if pipeline is not None:
+            stages = pipeline.process(self.data[slot], self.processed[slot])
+            dark_id = pipeline.dark_id(stages)
+        self.timestamps[slot] = timestamp
+        # Publish only after the slot is fully written
+        self.count += 1
+        return self.count - 1, self.views[slot], self.processed_views[slot], dark_id
+
+
+# ---------- Frames and Subscribers ----------
+# One frame object per acquisition, shared by every subscriber. intensities
+# (raw) and processed (pipeline output) are read-only views of ring slots, so
+# they stay valid for `depth` frames; keep a .copy() if you need one longer
+# (e.g. a stored dark spectrum).
+class SpectrumFrame:
+    __slots__ = ('seq', 'timestamp', 'wavelengths', 'intensities', 'processed', 'integration_ms', 'dark_id')
+
+    def __init__(self, seq, timestamp, wavelengths, intensities, processed, integration_ms, dark_id=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.wavelengths = wavelengths
+        self.intensities = intensities
+        self.processed = processed
+        self.integration_ms = integration_ms
+        self.dark_id = dark_id  # Id of the dark spectrum subtracted, None if none
+
+
+# Drop/keep policies when a subscriber falls behind:
+#   'latest'      - keep only the newest frame (plot, periodic logger)
+#   'drop_oldest' - bounded queue, discard the oldest queued frame
+#   'drop_newest' - bounded queue, discard the incoming frame
+SUBSCRIBER_POLICIES = ('latest', 'drop_oldest', 'drop_newest')
+
+class FrameSubscriber:
+    def __init__(self, name, policy='latest', maxsize=1):
+        if policy not in SUBSCRIBER_POLICIES:
+            raise ValueError(f"Unknown subscriber policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.maxsize = 1 if policy == 'latest' else maxsize
+        self.frames = deque()
+        self.cond = threading.Condition()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self.cond:
+            self.received += 1
+            if len(self.frames) >= self.maxsize:
+                self.dropped += 1
+                if self.policy == 'drop_newest':
+                    return
+                self.frames.popleft()
+            self.frames.append(frame)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        # Blocks until a frame is available, returns None on timeout
+        with self.cond:
+            if not self.frames:
+                self.cond.wait(timeout)
+            if not self.frames:
+                return None
+            return self.frames.popleft()
+
+    def get_nowait(self):
+        with self.cond:
+            if not self.frames:
+                return None
+            return self.frames.popleft()
+
+
+# ---------- Acquisition Worker ----------
+# Owns the sb.Spectrometer. spec.intensities() blocks for the whole integration
+# time, so it only ever runs on this thread and never on the Tk main loop.
+class SpectrometerWorker:
+    def __init__(self, integration_ms=50, depth=64, bus=None):
+        self.integration_ms = integration_ms
+        self.bus = bus  # Optional TelemetryBus, frames go out as 'spectrum'
+        self.depth = depth
+        self.spec = None
+        self.model = None
+        self.wavelengths = None
+        self.ring = None
+        self.pipeline = None
+        self.latest_frame = None
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self._pending_integration = None
+
+    def open(self):
+        devices = sb.list_devices()
+        if not devices:
+            return False
+        self.spec = sb.Spectrometer(devices[0])
+        self.spec.integration_time_micros(self.integration_ms * 1000)
+        self.model = self.spec.model
+        # The wavelength axis is fixed for a device, read it once
+        self.wavelengths = np.asarray(self.spec.wavelengths(), dtype=np.float64)
+        self.wavelengths.flags.writeable = False
+        self.ring = SpectrumRing(len(self.wavelengths), self.depth)
+        self.pipeline = ProcessingPipeline(len(self.wavelengths))
+        self.running = True
+        self.thread = threading.Thread(target=self._acquisition_loop, daemon=True)
+        self.thread.start()
+        return True
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            # Worst case we wait for one integration period to finish
+            self.thread.join(timeout=self.integration_ms / 1000 + 1.0)
+            self.thread = None
+        if self.spec is not None:
+            self.spec.close()
+            self.spec = None
+
+    def set_integration_time(self, value_ms):
+        # Applied by the acquisition thread between two reads
+        self._pending_integration = value_ms
+
+    def latest(self):
+        return self.latest_frame
+
+    def subscribe(self, name, policy='latest', maxsize=1):
+        if maxsize >= self.depth:
+            # Queued frames would point at ring slots that were already reused
+            raise ValueError("Subscriber queue must be shorter than the ring depth")
+        subscriber = FrameSubscriber(name, policy, maxsize)
+        with self.subscribers_lock:
+            self.subscribers = self.subscribers + [subscriber]
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.subscribers_lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscriber]
+
+    def _publish(self, frame):
+        self.latest_frame = frame
+        if self.bus is not None:
+            self.bus.publish('spectrum', frame, frame.timestamp)
+        # The list is replaced, never mutated, so no lock is needed to iterate
+        for subscriber in self.subscribers:
+            subscriber.put(frame)
+
+    def _acquisition_loop(self):
+        while self.running:
+            try:
+                if self._pending_integration is not None:
+                    self.integration_ms = self._pending_integration
+                    self._pending_integration = None
+                    self.spec.integration_time_micros(self.integration_ms * 1000)
+                intensities = self.spec.intensities()
+                timestamp = time.monotonic()
+                seq, raw, processed, dark_id = self.ring.write(intensities, timestamp, self.pipeline)
+                self._publish(SpectrumFrame(seq, timestamp, self.wavelengths, raw, processed,
+                                            self.integration_ms, dark_id))
+            except Exception as e:
+                print(f"Error acquiring spectrum: {e}")
+                time.sleep(0.5)
@@ -0,0 +1,187 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# ---------- Telemetry Bus ----------
+# Every sensor thread publishes its typed readings here under a topic name:
+#   'spectrum' SpectrumFrame   'gps'    GPSFix
+#   'dht11'    DHT11Reading    'system' SystemSample
+#   'camera'   frame number
+# latest(topic) is a single dict lookup with no lock, so the GUI can read it
+# every tick. Consumers that need every sample (logger, network) subscribe
+# with their own rate limit instead.
+class TelemetrySample:
+    __slots__ = ('topic', 'timestamp', 'value')
+
+    def __init__(self, topic, timestamp, value):
+        self.topic = topic
+        self.timestamp = timestamp  # time.monotonic() when the value was measured
+        self.value = value
+
+
+class TelemetrySubscriber:
+    # min_interval: seconds between two delivered samples of the same topic;
+    # faster samples are skipped and counted in `dropped`. With a callback the
+    # sample is handed over on the publishing thread, so keep callbacks short;
+    # otherwise it is queued (oldest discarded beyond maxsize) for get().
+    def __init__(self, topics, min_interval=0.0, callback=None, maxsize=256):
+        self.topics = topics
+        self.min_interval = min_interval
+        self.callback = callback
+        self.queue = deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.last_delivered = {}
+        self.delivered = 0
+        self.dropped = 0
+
+    def offer(self, sample):
+        last = self.last_delivered.get(sample.topic)
+        if last is not None and sample.timestamp - last < self.min_interval:
+            self.dropped += 1
+            return
+        self.last_delivered[sample.topic] = sample.timestamp
+        self.delivered += 1
+        if self.callback is not None:
+            self.callback(sample)
+            return
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(sample)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.queue:
+                self.cond.wait(timeout)
+            if not self.queue:
+                return None
+            return self.queue.popleft()
+
+
+class TelemetryBus:
+    def __init__(self):
+        self._latest = {}
+        self._subscribers = {}  # topic -> tuple of subscribers, None -> all topics
+        self._lock = threading.Lock()
+
+    def publish(self, topic, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        sample = TelemetrySample(topic, timestamp, value)
+        # A single dict store is atomic, readers never see a half-made sample
+        self._latest[topic] = sample
+        subscribers = self._subscribers
+        for subscriber in subscribers.get(topic, ()) + subscribers.get(None, ()):
+            subscriber.offer(sample)
+        return sample
+
+    def latest(self, topic):
+        return self._latest.get(topic)
+
+    def latest_value(self, topic, default=None):
+        sample = self._latest.get(topic)
+        return default if sample is None else sample.value
+
+    def subscribe(self, topics=None, min_interval=0.0, callback=None, maxsize=256):
+        # topics=None subscribes to everything
+        subscriber = TelemetrySubscriber(topics, min_interval, callback, maxsize)
+        with self._lock:
+            # Copy-on-write so publish() can iterate without the lock
+            subscribers = dict(self._subscribers)
+            for topic in (topics if topics is not None else [None]):
+                subscribers[topic] = subscribers.get(topic, ()) + (subscriber,)
+            self._subscribers = subscribers
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = {}
+            for topic, entries in self._subscribers.items():
+                remaining = tuple(s for s in entries if s is not subscriber)
+                if remaining:
+                    subscribers[topic] = remaining
+            self._subscribers = subscribers
+
+
+# ---------- Time Index ----------
+# Sorted timestamps of one topic, for nearest-sample lookups. Samples arrive
+# in order so appending is O(1); the list is trimmed back to `capacity` once
+# it doubles, which keeps both memory and the O(log n) lookup bounded.
+class TimeIndex:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.timestamps = []
+        self.values = []
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, value):
+        with self.lock:
+            if not self.timestamps or timestamp >= self.timestamps[-1]:
+                self.timestamps.append(timestamp)
+                self.values.append(value)
+            else:
+                i = bisect_left(self.timestamps, timestamp)
+                self.timestamps.insert(i, timestamp)
+                self.values.insert(i, value)
+            if len(self.timestamps) > 2 * self.capacity:
+                del self.timestamps[:-self.capacity]
+                del self.values[:-self.capacity]
+
+    def nearest(self, timestamp, tolerance=None):
+        # Value whose timestamp is closest to `timestamp`, or None if there is
+        # none within `tolerance` seconds
+        with self.lock:
+            ts = self.timestamps
+            i = bisect_left(ts, timestamp)
+            best = None
+            for j in (i - 1, i):
+                if 0 <= j < len(ts) and (best is None or abs(ts[j] - timestamp) < abs(ts[best] - timestamp)):
+                    best = j
+            if best is None or (tolerance is not None and abs(ts[best] - timestamp) > tolerance):
+                return None
+            return self.values[best]
+
+
+# ---------- Telemetry Join ----------
+# Indexes the given bus topics and, for a spectrum timestamp, picks the
+# nearest sample of each. `tolerances` is seconds per topic; a sample further
+# away than that is reported as missing rather than silently reused.
+JOIN_TOLERANCES = {'gps': 2.0, 'dht11': 5.0, 'camera': 0.1}
+
+class TelemetryJoiner:
+    def __init__(self, bus, tolerances=None, capacity=1024):
+        self.tolerances = dict(JOIN_TOLERANCES if tolerances is None else tolerances)
+        self.indexes = {topic: TimeIndex(capacity) for topic in self.tolerances}
+        self.subscriber = bus.subscribe(list(self.tolerances), callback=self._on_sample)
+
+    def _on_sample(self, sample):
+        self.indexes[sample.topic].append(sample.timestamp, sample.value)
+
+    def join(self, timestamp):
+        return {topic: index.nearest(timestamp, self.tolerances[topic])
+                for topic, index in self.indexes.items()}
+
+
+# ---------- Spectrum Record ----------
+# A spectrum plus the conditions it was taken in, joined at write time.
+class SpectrumRecord:
+    __slots__ = ('frame', 'gps', 'dht11', 'camera_frame')
+
+    FIELDS = ('seq', 'timestamp', 'integration_ms', 'dark_id', 'latitude', 'longitude',
+              'altitude', 'gps_valid', 'temperature', 'humidity', 'camera_frame')
+
+    def __init__(self, frame, joined):
+        self.frame = frame
+        self.gps = joined.get('gps')
+        self.dht11 = joined.get('dht11')
+        self.camera_frame = joined.get('camera')
+
+    def metadata(self):
+        frame, gps, dht11 = self.frame, self.gps, self.dht11
+        return (frame.seq, frame.timestamp, frame.integration_ms, frame.dark_id,
+                gps.latitude if gps else None, gps.longitude if gps else None,
+                gps.altitude if gps else None, gps.valid if gps else None,
+                dht11.temperature if dht11 else None, dht11.humidity if dht11 else None,
+                self.camera_frame)
@@ -11,78 +11,155 @@ int PWM4 = 11; // Motor 4 Front Left
 int IN7 = 12;
 int IN8 = 13;
 
+// Speeds currently applied, and the setpoints they ramp towards
 int motorSpeedLeft = 0;
 int motorSpeedRight = 0;
+int targetSpeedLeft = 0;
+int targetSpeedRight = 0;
+
+// Binary frames from the Pi, 8 bytes (must match rover.py):
+//   0xA5 | opcode | seq | left speed (int16 LE) | right speed (int16 LE) | CRC-8
+// The CRC (polynomial 0x07) covers opcode..right speed. Every good frame is
+// answered with an ACK frame carrying the same seq and the applied speeds.
+// OP_DRIVE speeds are setpoints; each side ramps towards its setpoint by at
+// most RAMP_STEP every RAMP_INTERVAL_MS (0 to full speed in about 0.5 s).
+// The Pi sends a drive setpoint or a heartbeat at least every 200 ms; if
+// nothing arrives for WATCHDOG_MS the motors are stopped and an OP_WATCHDOG
+// frame is sent (seq = number of watchdog stops).
+const byte SYNC = 0xA5;
+const byte OP_DRIVE = 0x01;
+const byte OP_HEARTBEAT = 0x02;
+const byte OP_ACK = 0x80;
+const byte OP_WATCHDOG = 0x81;
+const byte FRAME_SIZE = 8;
+const unsigned long WATCHDOG_MS = 500;
+const int RAMP_STEP = 5;
+const unsigned long RAMP_INTERVAL_MS = 10;
+
+byte frame[FRAME_SIZE];
+byte frameLength = 0;
+unsigned int crcErrors = 0;
+unsigned long lastFrameMillis = 0;
+unsigned long lastRampMillis = 0;
+byte watchdogStops = 0;
 
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(115200);
 
   // Set all motor pins as output
   pinMode(PWM1, OUTPUT); pinMode(IN1, OUTPUT); pinMode(IN2, OUTPUT);
   pinMode(PWM2, OUTPUT); pinMode(IN3, OUTPUT); pinMode(IN4, OUTPUT);
   pinMode(PWM3, OUTPUT); pinMode(IN5, OUTPUT); pinMode(IN6, OUTPUT);
   pinMode(PWM4, OUTPUT); pinMode(IN7, OUTPUT); pinMode(IN8, OUTPUT);
+
+  controlMotors(0, 0);
 }
 
 void loop() {
-  if (Serial.available() > 0) {
-    String command = Serial.readStringUntil('\n');
-    controlMotors(command);
+  // Never blocks: takes whatever bytes have arrived and handles complete frames
+  while (Serial.available() > 0) {
+    byte b = Serial.read();
+    if (frameLength == 0 && b != SYNC) {
+      continue;  // Wait for the start of a frame
+    }
+    frame[frameLength++] = b;
+    if (frameLength == FRAME_SIZE) {
+      handleFrame();
+    }
+  }
+
+  // Dead-man stop: the link or the Pi has gone quiet while driving. This
+  // one does not ramp.
+  bool driving = motorSpeedLeft != 0 || motorSpeedRight != 0 || targetSpeedLeft != 0 || targetSpeedRight != 0;
+  if (driving && millis() - lastFrameMillis > WATCHDOG_MS) {
+    targetSpeedLeft = 0;
+    targetSpeedRight = 0;
+    controlMotors(0, 0);
+    watchdogStops++;
+    sendFrame(OP_WATCHDOG, watchdogStops);
+  }
+
+  if (millis() - lastRampMillis >= RAMP_INTERVAL_MS) {
+    lastRampMillis = millis();
+    if (motorSpeedLeft != targetSpeedLeft || motorSpeedRight != targetSpeedRight) {
+      controlMotors(rampTowards(motorSpeedLeft, targetSpeedLeft), rampTowards(motorSpeedRight, targetSpeedRight));
+    }
+  }
+}
+
+int rampTowards(int current, int target) {
+  if (target > current) {
+    return min(current + RAMP_STEP, target);
+  }
+  return max(current - RAMP_STEP, target);
+}
+
+byte crc8(const byte *data, byte length) {
+  byte crc = 0;
+  for (byte i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (byte bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void handleFrame() {
+  if (crc8(frame + 1, FRAME_SIZE - 2) != frame[FRAME_SIZE - 1]) {
+    // Drop the sync byte and look for the next one in what is left
+    crcErrors++;
+    byte next = 1;
+    while (next < FRAME_SIZE && frame[next] != SYNC) {
+      next++;
+    }
+    frameLength = FRAME_SIZE - next;
+    memmove(frame, frame + next, frameLength);
+    return;
+  }
+  frameLength = 0;
+  lastFrameMillis = millis();
+
+  byte opcode = frame[1];
+  byte seq = frame[2];
+  int left = (int16_t)(frame[3] | (frame[4] << 8));
+  int right = (int16_t)(frame[5] | (frame[6] << 8));
+
+  if (opcode == OP_DRIVE) {
+    targetSpeedLeft = constrain(left, -255, 255);
+    targetSpeedRight = constrain(right, -255, 255);
   }
+  sendFrame(OP_ACK, seq);
+}
+
+// Replies always carry the speeds currently applied
+void sendFrame(byte opcode, byte seq) {
+  byte reply[FRAME_SIZE];
+  reply[0] = SYNC;
+  reply[1] = opcode;
+  reply[2] = seq;
+  reply[3] = motorSpeedLeft & 0xFF; reply[4] = (motorSpeedLeft >> 8) & 0xFF;
+  reply[5] = motorSpeedRight & 0xFF; reply[6] = (motorSpeedRight >> 8) & 0xFF;
+  reply[7] = crc8(reply + 1, FRAME_SIZE - 2);
+  Serial.write(reply, FRAME_SIZE);
 }
 
-void controlMotors(String command) {
-  int motorSpeed = 250; // Adjust speed as needed
-
-  if (command == "forward") {
-    // Forward
-    digitalWrite(IN1, LOW); digitalWrite(IN2, HIGH);
-    digitalWrite(IN3, LOW); digitalWrite(IN4, HIGH);
-    digitalWrite(IN5, LOW); digitalWrite(IN6, HIGH);
-    digitalWrite(IN7, LOW); digitalWrite(IN8, HIGH);
-    analogWrite(PWM1, motorSpeed);
-    analogWrite(PWM2, motorSpeed);
-    analogWrite(PWM3, motorSpeed);
-    analogWrite(PWM4, motorSpeed);
-  } else if (command == "backward") {
-    // Backward
-    digitalWrite(IN1, HIGH); digitalWrite(IN2, LOW);
-    digitalWrite(IN3, HIGH); digitalWrite(IN4, LOW);
-    digitalWrite(IN5, HIGH); digitalWrite(IN6, LOW);
-    digitalWrite(IN7, HIGH); digitalWrite(IN8, LOW);
-    analogWrite(PWM1, motorSpeed);
-    analogWrite(PWM2, motorSpeed);
-    analogWrite(PWM3, motorSpeed);
-    analogWrite(PWM4, motorSpeed);
-  } else if (command == "left") {
-    // Left
-    digitalWrite(IN1, HIGH); digitalWrite(IN2, LOW);
-    digitalWrite(IN3, LOW); digitalWrite(IN4, HIGH);
-    digitalWrite(IN5, HIGH); digitalWrite(IN6, LOW);
-    digitalWrite(IN7, LOW); digitalWrite(IN8, HIGH);
-    analogWrite(PWM1, motorSpeed);
-    analogWrite(PWM2, motorSpeed);
-    analogWrite(PWM3, motorSpeed);
-    analogWrite(PWM4, motorSpeed);
-  } else if (command == "right") {
-    // Right
-    digitalWrite(IN1, LOW);
-    digitalWrite(IN2, HIGH);
-    digitalWrite(IN3, HIGH);
-    digitalWrite(IN4, LOW);
-    digitalWrite(IN5, LOW);
-    digitalWrite(IN6, HIGH);
-    digitalWrite(IN7, HIGH);
-    digitalWrite(IN8, LOW);
-    analogWrite(PWM1, motorSpeed);
-    analogWrite(PWM2, motorSpeed);
-    analogWrite(PWM3, motorSpeed);
-    analogWrite(PWM4, motorSpeed);
-  } else if (command == "stop") {
-    // Stop
-    analogWrite(PWM1, 0);
-    analogWrite(PWM2, 0);
-    analogWrite(PWM3, 0);
-    analogWrite(PWM4, 0);
+// Positive speed turns a motor forward, negative backward
+void setMotor(int pwm, int inA, int inB, int speed) {
+  if (speed >= 0) {
+    digitalWrite(inA, LOW); digitalWrite(inB, HIGH);
+  } else {
+    digitalWrite(inA, HIGH); digitalWrite(inB, LOW);
   }
+  analogWrite(pwm, min(abs(speed), 255));
+}
+
+void controlMotors(int left, int right) {
+  motorSpeedLeft = constrain(left, -255, 255);
+  motorSpeedRight = constrain(right, -255, 255);
+
+  setMotor(PWM1, IN1, IN2, motorSpeedRight); // Rear Right
+  setMotor(PWM3, IN5, IN6, motorSpeedRight); // Front Right
+  setMotor(PWM2, IN3, IN4, motorSpeedLeft);  // Rear Left
+  setMotor(PWM4, IN7, IN8, motorSpeedLeft);  // Front Left
 }